@@ -0,0 +1,3222 @@
+"""Simulation and optimization of the inventory policies of the production line.
+
+This module holds everything the notebook runs, so that worker processes and scripts can use it
+without the notebook. Importing it has no side effects. pandas, polars, SimPy and tqdm are only
+imported by the functions that need them.
+"""
+
+import bisect
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import numbers
+import operator
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
+from statistics import NormalDist
+
+def _progress_bar(iterable, description=None, disable=False, **kwargs):
+    """Wrap an iterable in a tqdm progress bar, importing tqdm only when the bar is shown or updated by hand."""
+    if disable and iterable is not None:
+        return iterable
+    from tqdm.auto import tqdm
+    return tqdm(iterable, description, disable=disable, **kwargs)
+
+# The following section defines the simualtion model.
+
+def day_rng(seed, day):
+    """Return the random number generator of a day, independent of every other day's stream.
+
+    A (seed, replication) pair selects the streams of a replication, spawned with the key (replication, day)."""
+    entropy, *spawn_key = seed if isinstance(seed, tuple) else (seed,)
+    return np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(*spawn_key, day)))
+
+def sample_travel_times(num_handlers, rng):
+    """Draw the handler travel time to each station for one day."""
+    return {
+        'Station 1': 5 + (2 + 1.5*num_handlers)*rng.lognormal(sigma=0.2),
+        'Station 2': 10 + (2 + 1.5*num_handlers)*rng.lognormal(sigma=0.3),
+        'Station 3': 12.5 + (2 + 1.5*num_handlers)*rng.lognormal(sigma=0.4),
+        'Station 4': 15 + (2 + 1.5*num_handlers)*rng.lognormal(sigma=0.5),
+        'Station 5': 20 + (2 + 1.5*num_handlers)*rng.lognormal(sigma=0.5),
+    }
+
+# The following section defines opt-in instrumentation of the SimPy model. When a
+# `ProductionInstruments` object is passed to `ProductionSystem`, it records the queue each vehicle
+# finds at a station and how long it waits there. It also records how long each order waits for a
+# handler and how many orders are queued, the handlers' busy time, the orders placed at each station
+# and how long they are outstanding, and the stockouts of each variant. `simulate_day` adds the
+# number of SimPy events and the wall time of the day. Without instruments, the model only checks
+# for them and records nothing. `SimulationTrace` collects one flat record per day and exports them
+# as a polars or Parquet table.
+
+class ProductionInstruments:
+    def __init__(self, stations, variants):
+        self.queue_max = dict.fromkeys(stations, 0)
+        self.wait_time = dict.fromkeys(stations, 0.0)
+        self.served = dict.fromkeys(stations, 0)
+        self.orders = dict.fromkeys(stations, 0)
+        self.order_time = dict.fromkeys(stations, 0.0)
+        self.handler_queue_max = 0
+        self.handler_wait_time = 0.0
+        self.handler_busy_time = 0.0
+        self.stockouts = dict.fromkeys(variants, 0)
+        self.events = 0
+        self.wall_time = 0.0
+
+    def record(self, day, num_handlers, duration):
+        """Return the day's measurements as one flat record."""
+        day_trace = {'day': day}
+        for idx, station in enumerate(self.queue_max, 1):
+            day_trace[f'S{idx}_queue_max'] = self.queue_max[station]
+            day_trace[f'S{idx}_wait_mean'] = self.wait_time[station]/max(1, self.served[station])
+            day_trace[f'S{idx}_orders'] = self.orders[station]
+            day_trace[f'S{idx}_order_time'] = self.order_time[station]
+        day_trace['handler_queue_max'] = self.handler_queue_max
+        day_trace['handler_wait_mean'] = self.handler_wait_time/max(1, sum(self.orders.values()))
+        day_trace['handler_busy_time'] = self.handler_busy_time
+        day_trace['handler_utilization'] = self.handler_busy_time/(num_handlers*duration)
+        for cvariant, stockouts in self.stockouts.items():
+            day_trace[f'{cvariant}_stockouts'] = stockouts
+        day_trace['events'] = self.events
+        day_trace['wall_time'] = self.wall_time
+        return day_trace
+
+class SimulationTrace:
+    def __init__(self):
+        self.day_traces = []
+
+    def append(self, day_trace):
+        self.day_traces.append(day_trace)
+
+    def __len__(self):
+        return len(self.day_traces)
+
+    def to_polars(self):
+        import polars as pl
+        return pl.DataFrame(self.day_traces)
+
+    def write_parquet(self, path):
+        self.to_polars().write_parquet(path)
+
+class ProductionSystem:
+    def __init__(
+        self,
+        env,
+        handlers,
+        stations,
+        component_assignments,
+        inventory_allocations,
+        reorder_points,
+        metrics_dict,
+        rng=None,
+        instruments=None,
+    ):
+        if rng is None:
+            rng = np.random.default_rng()
+        self.instruments = instruments
+        self.env = env
+        self.handlers = handlers
+        self.stations = stations
+        self.metrics_dict = metrics_dict
+        self.orders_outstanding = {
+            'Station 1': False,
+            'Station 2': False,
+            'Station 3': False,
+            'Station 4': False,
+            'Station 5': False,
+        }
+        self.travel_time_distributions = sample_travel_times(handlers.capacity, rng)
+        self.component_assignments = component_assignments
+        self.inventory_allocations = inventory_allocations
+        self.reorder_points = reorder_points
+        self.available_inventory = dict(self.inventory_allocations)
+        self.inventory_position = dict(self.available_inventory)
+
+        # Variants each station reorders, and how many of them are at or below their reorder point
+        self.station_variants = {
+            station: [
+                component_variant for component_variant in self.reorder_points
+                if component_variant.startswith(self.component_assignments[station])
+            ]
+            for station in self.stations
+        }
+        self.variants_to_reorder = {
+            station: sum(
+                self.inventory_position[component_variant] <= self.reorder_points[component_variant]
+                for component_variant in self.station_variants[station]
+            )
+            for station in self.stations
+        }
+
+    def process_item(self, vehicle, vehicle_data):
+        """Simulate an item moving through five stations."""
+
+        for station in self.stations:
+            with self.stations[station].request() as request:
+                if self.instruments is not None:
+                    requested_at = self.env.now
+                    self.instruments.queue_max[station] = max(self.instruments.queue_max[station], len(self.stations[station].queue))
+                yield request
+                if self.instruments is not None:
+                    self.instruments.wait_time[station] += self.env.now - requested_at
+                    self.instruments.served[station] += 1
+
+                assigned_component = self.component_assignments[station]
+                component_variant = vehicle_data[assigned_component]
+
+                if self.available_inventory[component_variant] == 0:
+                    self.metrics_dict[f'{assigned_component}_repairs'] += 1
+                    if self.instruments is not None:
+                        self.instruments.stockouts[component_variant] += 1
+                else:
+                    self.available_inventory[component_variant] -= 1
+                    self.inventory_position[component_variant] -= 1
+                    if self.inventory_position[component_variant] == self.reorder_points.get(component_variant):
+                        self.variants_to_reorder[station] += 1
+
+                yield self.env.timeout(1)
+
+    def reorder_due(self):
+        """Return True if a station without an outstanding order needs one."""
+        return any(
+            self.variants_to_reorder[station] and not self.orders_outstanding[station]
+            for station in self.stations
+        )
+
+    def inventory_control(self):
+        """Periodically check the level of the gas station tank and call the tank
+        truck if the level falls below a threshold."""
+        for station in self.stations:
+            if not self.orders_outstanding[station] and self.variants_to_reorder[station]:
+                self.orders_outstanding[station] = True
+                with self.handlers.request() as handler_request:
+                    if self.instruments is not None:
+                        requested_at = self.env.now
+                        self.instruments.handler_queue_max = max(self.instruments.handler_queue_max, len(self.handlers.queue))
+                    yield handler_request
+                    orders = {}
+                    for component_variant in self.station_variants[station]:
+                        if self.inventory_position[component_variant] <= self.reorder_points[component_variant]:
+                            order_size = self.inventory_allocations[component_variant] - self.available_inventory[component_variant]
+                            orders[component_variant] = order_size
+
+                    order_time = self.env.now
+                    for ordered_component, ordered_amount in orders.items():
+                        self.inventory_position[ordered_component] += ordered_amount
+                    self.variants_to_reorder[station] = sum(
+                        self.inventory_position[component_variant] <= self.reorder_points[component_variant]
+                        for component_variant in self.station_variants[station]
+                    )
+
+                    yield self.env.timeout(self.travel_time_distributions[station])
+
+                    for ordered_component, ordered_amount in orders.items():
+                        self.available_inventory[ordered_component] += ordered_amount
+                    self.orders_outstanding[station] = False
+                    if self.instruments is not None:
+                        self.instruments.orders[station] += 1
+                        self.instruments.order_time[station] += self.env.now - requested_at
+                        self.instruments.handler_wait_time += order_time - requested_at
+                        self.instruments.handler_busy_time += self.env.now - order_time
+
+def generate_arrivals(env, production_system, vehicle_information):
+    """Generate arrivals based on given arrival times."""
+    for vehicle, vehicle_data in vehicle_information.items():
+        arrival_time = vehicle_data['arrival_time']
+        yield env.timeout(arrival_time - env.now)
+
+        env.process(production_system.process_item(vehicle, vehicle_data))
+        # A check that finds nothing to order has no effect, so only start one when it will order
+        if production_system.reorder_due():
+            env.process(production_system.inventory_control())
+
+# The following section defines a fast replica of the simulation model that does not use SimPy.
+# Every station serves one vehicle per minute, so the time a vehicle starts at each station follows
+# directly from the tandem-queue recurrence. Only the handler orders need to be scheduled, which is
+# done on a small heap in the same order SimPy would process them. It produces the same metrics as
+# `ProductionSystem` at a fraction of the cost.
+
+class FastProductionSystem:
+    def __init__(
+        self,
+        num_handlers,
+        component_assignments,
+        inventory_allocations,
+        reorder_points,
+        metrics_dict,
+        rng=None,
+    ):
+        if rng is None:
+            rng = np.random.default_rng()
+        self.num_handlers = num_handlers
+        self.metrics_dict = metrics_dict
+        self.stations = ['Station 1', 'Station 2', 'Station 3', 'Station 4', 'Station 5']
+        self.travel_time_distributions = sample_travel_times(num_handlers, rng)
+        self.component_assignments = component_assignments
+        self.inventory_allocations = inventory_allocations
+        self.reorder_points = reorder_points
+
+    def station_start_times(self, arrival_times):
+        """Compute when each vehicle starts service at each station."""
+        # Replicate the clock SimPy keeps while generate_arrivals waits for each arrival
+        arrival_clock = np.empty(len(arrival_times))
+        now = 0
+        for vehicle, arrival_time in enumerate(arrival_times):
+            now = now + (arrival_time - now)
+            arrival_clock[vehicle] = now
+
+        start_times = np.empty((len(arrival_times), len(self.stations)))
+        if np.all(arrival_clock[1:] >= arrival_clock[:-1] + 1):
+            # Vehicles never wait, so each one moves down the line a minute per station
+            start_times[:, 0] = arrival_clock
+            for idx in range(1, len(self.stations)):
+                start_times[:, idx] = start_times[:, idx - 1] + 1
+        else:
+            previous_start = [-math.inf]*len(self.stations)
+            for vehicle, now in enumerate(arrival_clock):
+                for idx in range(len(self.stations)):
+                    now = max(now, previous_start[idx] + 1)
+                    start_times[vehicle, idx] = now
+                    previous_start[idx] = now
+                    now = now + 1
+        return arrival_clock, start_times
+
+    def run(self, arrival_times, day_variants, variant_labels):
+        """Simulate one day of vehicles given their arrival times and variant codes."""
+        station_count = len(self.stations)
+        station_components = [self.component_assignments[station] for station in self.stations]
+        station_variants = [
+            [cvariant for cvariant in self.reorder_points if cvariant.startswith(component)]
+            for component in station_components
+        ]
+        travel_times = [self.travel_time_distributions[station] for station in self.stations]
+
+        # Work on integer variant codes so the event loop only touches lists
+        variant_codes = {cvariant: code for code, cvariant in enumerate(self.inventory_allocations)}
+        allocations = list(self.inventory_allocations.values())
+        available = list(allocations)
+        position = list(allocations)
+        reorder_levels = [self.reorder_points.get(cvariant, -math.inf) for cvariant in self.inventory_allocations]
+        station_codes = [[variant_codes[cvariant] for cvariant in cvariants] for cvariants in station_variants]
+        below_reorder = [
+            sum(position[code] <= reorder_levels[code] for code in codes) for codes in station_codes
+        ]
+        orders_outstanding = [False]*station_count
+        repairs = [0]*station_count
+        self.handler_log = [[] for _ in range(station_count)]
+
+        vehicle_count = len(arrival_times)
+        arrival_clock, start_times = self.station_start_times(arrival_times)
+        consumed_codes = np.empty((vehicle_count, station_count), dtype=np.int64)
+        for idx, component in enumerate(station_components):
+            label_codes = np.array([variant_codes.get(label, -1) for label in variant_labels[component]], dtype=np.int64)
+            consumed_codes[:, idx] = label_codes[day_variants[component]]
+            if (consumed_codes[:, idx] < 0).any():
+                missing = variant_labels[component][day_variants[component][consumed_codes[:, idx] < 0][0]]
+                raise KeyError(missing)
+        self.variant_codes, self.start_times, self.consumed_codes = variant_codes, start_times, consumed_codes
+
+        # Static events are inventory checks at arrivals and consumptions at station starts.
+        # At equal times a check runs before a consumption, and both run before handler events.
+        event_times = np.concatenate([arrival_clock, start_times.ravel()])
+        event_kinds = np.concatenate([
+            np.full(vehicle_count, -1, dtype=np.int64),
+            np.tile(np.arange(station_count), vehicle_count),
+        ])
+        event_codes = np.concatenate([
+            np.zeros(vehicle_count, dtype=np.int64),
+            consumed_codes.ravel(),
+        ])
+        event_order = np.lexsort((np.arange(len(event_times)), event_kinds >= 0, event_times))
+
+        handler_events = []
+        handler_queue = []
+        handler_sequence = 0
+        handlers_busy = 0
+
+        def request_handler(now, first_station):
+            """Place an order for the first station due for one, as inventory_control does."""
+            nonlocal handler_sequence, handlers_busy
+            for idx in range(first_station, station_count):
+                if not orders_outstanding[idx] and below_reorder[idx]:
+                    orders_outstanding[idx] = True
+                    if handlers_busy < self.num_handlers:
+                        handlers_busy += 1
+                        heapq.heappush(handler_events, (now, handler_sequence, idx, None))
+                        handler_sequence += 1
+                    else:
+                        handler_queue.append(idx)
+                    return
+
+        for event_time, event_kind, event_code in zip(
+            event_times[event_order].tolist(),
+            event_kinds[event_order].tolist(),
+            event_codes[event_order].tolist(),
+        ):
+            while handler_events and handler_events[0][0] < event_time:
+                now, _, idx, orders = heapq.heappop(handler_events)
+                self.handler_log[idx].append((now, orders is not None))
+                if orders is None:
+                    # The handler picked up the order, so size it and send it out
+                    orders = []
+                    for code in station_codes[idx]:
+                        if position[code] <= reorder_levels[code]:
+                            orders.append((code, allocations[code] - available[code]))
+                    for code, ordered_amount in orders:
+                        position[code] += ordered_amount
+                    below_reorder[idx] = sum(position[code] <= reorder_levels[code] for code in station_codes[idx])
+                    heapq.heappush(handler_events, (now + travel_times[idx], handler_sequence, idx, orders))
+                    handler_sequence += 1
+                else:
+                    # The order arrived, so release the handler and keep checking later stations
+                    for code, ordered_amount in orders:
+                        available[code] += ordered_amount
+                    orders_outstanding[idx] = False
+                    handlers_busy -= 1
+                    if handler_queue:
+                        handlers_busy += 1
+                        heapq.heappush(handler_events, (now, handler_sequence, handler_queue.pop(0), None))
+                        handler_sequence += 1
+                    request_handler(now, idx + 1)
+
+            if event_kind < 0:
+                request_handler(event_time, 0)
+            elif available[event_code] == 0:
+                repairs[event_kind] += 1
+            else:
+                available[event_code] -= 1
+                position[event_code] -= 1
+                if position[event_code] == reorder_levels[event_code]:
+                    below_reorder[event_kind] += 1
+
+        for idx, component in enumerate(station_components):
+            self.metrics_dict[f'{component}_repairs'] += repairs[idx]
+
+# The following section defines a batched version of the fast simulation model. Arrivals, vehicle
+# variants, station start times and travel times do not depend on the inventory policy, so they are
+# computed once per day and shared by every candidate policy. Each candidate then only steps through
+# its own handler orders. Between two orders a variant's stock just counts down through its
+# consumption times, so the simulation jumps from order to order. It looks up when each station next
+# reaches a reorder point, and counts the repairs in between, instead of visiting every vehicle.
+
+class BatchProductionSystem(FastProductionSystem):
+    def __init__(
+        self,
+        num_handlers,
+        component_assignments,
+        candidates,
+        metrics_dict,
+        rng=None,
+    ):
+        inventory_allocations, reorder_points = candidates[0]
+        super().__init__(
+            num_handlers=num_handlers,
+            component_assignments=component_assignments,
+            inventory_allocations=inventory_allocations,
+            reorder_points=reorder_points,
+            metrics_dict=metrics_dict,
+            rng=rng,
+        )
+        self.candidates = candidates
+
+    def run(self, arrival_times, day_variants, variant_labels):
+        """Simulate one day of vehicles for every candidate policy."""
+        station_count = len(self.stations)
+        station_components = [self.component_assignments[station] for station in self.stations]
+        travel_times = [self.travel_time_distributions[station] for station in self.stations]
+
+        variant_codes = {cvariant: code for code, cvariant in enumerate(self.inventory_allocations)}
+        variant_stations = [
+            next(idx for idx, component in enumerate(station_components) if cvariant.startswith(component))
+            for cvariant in variant_codes
+        ]
+        station_codes = [
+            [code for code, station in enumerate(variant_stations) if station == idx]
+            for idx in range(station_count)
+        ]
+
+        arrival_clock, start_times = self.station_start_times(arrival_times)
+        consumption_times = [[] for _ in variant_codes]
+        for idx, component in enumerate(station_components):
+            label_codes = np.array([variant_codes.get(label, -1) for label in variant_labels[component]], dtype=np.int64)
+            consumed_codes = label_codes[day_variants[component]]
+            if (consumed_codes < 0).any():
+                raise KeyError(variant_labels[component][day_variants[component][consumed_codes < 0][0]])
+            for code in station_codes[idx]:
+                consumption_times[code] = start_times[consumed_codes == code, idx].tolist()
+        arrival_clock = arrival_clock.tolist()
+        last_event_time = max(arrival_clock[-1], start_times[-1, -1]) if arrival_clock else 0
+
+        repairs = np.zeros((station_count, len(self.candidates)), dtype=np.int64)
+        for candidate, (inventory_allocations, reorder_points) in enumerate(self.candidates):
+            allocations = [inventory_allocations[cvariant] for cvariant in variant_codes]
+            reorder_levels = [reorder_points.get(cvariant, -1) for cvariant in variant_codes]
+            repairs[:, candidate] = self.run_candidate(
+                allocations,
+                reorder_levels,
+                station_codes,
+                variant_stations,
+                consumption_times,
+                arrival_clock,
+                travel_times,
+                last_event_time,
+            )
+
+        for idx, component in enumerate(station_components):
+            self.metrics_dict[f'{component}_repairs'] = self.metrics_dict[f'{component}_repairs'] + repairs[idx]
+
+    def run_candidate(
+        self,
+        allocations,
+        reorder_levels,
+        station_codes,
+        variant_stations,
+        consumption_times,
+        arrival_clock,
+        travel_times,
+        last_event_time,
+    ):
+        """Step one candidate through its handler orders and return its repairs per station."""
+        station_count = len(station_codes)
+        available = list(allocations)
+        position = list(allocations)
+        consumed = [0]*len(allocations)
+        repairs = [0]*station_count
+        orders_outstanding = [False]*station_count
+        handler_events = []
+        handler_queue = []
+        handler_sequence = 0
+        handlers_busy = 0
+
+        def catch_up(codes, now):
+            """Apply the consumptions of variants up to a handler event at now, counting repairs."""
+            for code in codes:
+                count = bisect.bisect_right(consumption_times[code], now) - consumed[code]
+                if count:
+                    stocked = min(count, available[code])
+                    repairs[variant_stations[code]] += count - stocked
+                    available[code] -= stocked
+                    position[code] -= stocked
+                    consumed[code] += count
+
+        def reorder_time(idx):
+            """Return the time of the consumption that brings the station to a reorder point."""
+            # Without an outstanding order every consumption until then is stocked
+            reorder_at = math.inf
+            for code in station_codes[idx]:
+                if reorder_levels[code] < 0:
+                    continue
+                if position[code] <= reorder_levels[code]:
+                    return -math.inf
+                consumption = consumed[code] + position[code] - reorder_levels[code] - 1
+                if consumption < len(consumption_times[code]):
+                    reorder_at = min(reorder_at, consumption_times[code][consumption])
+            return reorder_at
+
+        def request_handler(idx, now):
+            nonlocal handler_sequence, handlers_busy
+            orders_outstanding[idx] = True
+            if handlers_busy < self.num_handlers:
+                handlers_busy += 1
+                heapq.heappush(handler_events, (now, handler_sequence, idx, None))
+                handler_sequence += 1
+            else:
+                handler_queue.append(idx)
+
+        reorder_times = [reorder_time(idx) for idx in range(station_count)]
+        next_arrival = 0
+        while True:
+            # The next arrival whose inventory check places an order, assuming no handler event comes first
+            check_arrival = None
+            for idx in range(station_count):
+                if not orders_outstanding[idx] and reorder_times[idx] < math.inf:
+                    arrival = max(next_arrival, bisect.bisect_right(arrival_clock, reorder_times[idx]))
+                    if check_arrival is None or arrival < check_arrival:
+                        check_arrival = arrival
+            if check_arrival is not None and check_arrival >= len(arrival_clock):
+                check_arrival = None
+
+            if handler_events and (check_arrival is None or handler_events[0][0] < arrival_clock[check_arrival]):
+                now, _, idx, orders = heapq.heappop(handler_events)
+                if check_arrival is None and now > last_event_time:
+                    break
+                if orders is None:
+                    catch_up(station_codes[idx], now)
+                    orders = []
+                    for code in station_codes[idx]:
+                        if position[code] <= reorder_levels[code]:
+                            orders.append((code, allocations[code] - available[code]))
+                    for code, ordered_amount in orders:
+                        position[code] += ordered_amount
+                    heapq.heappush(handler_events, (now + travel_times[idx], handler_sequence, idx, orders))
+                    handler_sequence += 1
+                else:
+                    # Variants that were not ordered can stay behind, since nothing was delivered to them
+                    catch_up([code for code, _ in orders], now)
+                    for code, ordered_amount in orders:
+                        available[code] += ordered_amount
+                    orders_outstanding[idx] = False
+                    reorder_times[idx] = reorder_time(idx)
+                    handlers_busy -= 1
+                    if handler_queue:
+                        handlers_busy += 1
+                        heapq.heappush(handler_events, (now, handler_sequence, handler_queue.pop(0), None))
+                        handler_sequence += 1
+                    for later_idx in range(idx + 1, station_count):
+                        if not orders_outstanding[later_idx] and reorder_times[later_idx] <= now:
+                            request_handler(later_idx, now)
+                            break
+                next_arrival = max(next_arrival, bisect.bisect_right(arrival_clock, now))
+            elif check_arrival is not None:
+                now = arrival_clock[check_arrival]
+                for idx in range(station_count):
+                    if not orders_outstanding[idx] and reorder_times[idx] < now:
+                        request_handler(idx, now)
+                        break
+                next_arrival = check_arrival + 1
+            else:
+                break
+
+        catch_up(range(len(allocations)), math.inf)
+        return repairs
+
+# The following section defines a station-decomposed version of the fast simulation model, for lines
+# with at least one handler per station. Each station has at most one order outstanding, so the
+# handlers never queue. A station then only interacts with the others through the inventory checks
+# that reach it. A check at an arrival moves down the line until it finds a station due for an
+# order. It waits there until the order is delivered, and then moves on to the next station. Each
+# station is simulated on its own, given the checks that reach it, and it hands the checks that pass
+# on to the next station. When the caller passes a `StationCache`, the results are kept in it by a
+# hash of a station's policy and inputs. When a neighbor solution only changes one component, the
+# stations before it are then read from the cache. The stations after it are only simulated again if
+# the checks reaching them change. A cache belongs to one caller and is not safe to share between
+# threads.
+
+class StationCache:
+    def __init__(self, max_entries=8192):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """Return the result of a station stored under key, or None."""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, station_result):
+        """Store the result of a station under key, forgetting the least recently used ones."""
+        self.entries[key] = station_result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+class StationProductionSystem(FastProductionSystem):
+    def __init__(
+        self,
+        num_handlers,
+        component_assignments,
+        inventory_allocations,
+        reorder_points,
+        metrics_dict,
+        rng=None,
+        station_cache=None,
+    ):
+        super().__init__(
+            num_handlers=num_handlers,
+            component_assignments=component_assignments,
+            inventory_allocations=inventory_allocations,
+            reorder_points=reorder_points,
+            metrics_dict=metrics_dict,
+            rng=rng,
+        )
+        self.station_cache = station_cache
+
+    def run(self, arrival_times, day_variants, variant_labels):
+        """Simulate one day of vehicles one station at a time."""
+        assert self.num_handlers >= len(self.stations), 'Stations only decompose with at least one handler per station'
+        arrival_clock, start_times = self.station_start_times(arrival_times)
+        last_event_time = max(arrival_clock[-1], start_times[-1, -1]) if len(arrival_clock) else 0
+
+        check_times = arrival_clock
+        check_kinds = np.zeros(len(arrival_clock), dtype=np.int8)
+        check_digest = b''
+        for idx, station in enumerate(self.stations):
+            component = self.component_assignments[station]
+            cvariants = [cvariant for cvariant in self.inventory_allocations if cvariant.startswith(component)]
+            variant_codes = {cvariant: code for code, cvariant in enumerate(cvariants)}
+            label_codes = np.array([variant_codes.get(label, -1) for label in variant_labels[component]], dtype=np.int64)
+            consumed_codes = label_codes[day_variants[component]]
+            if (consumed_codes < 0).any():
+                raise KeyError(variant_labels[component][day_variants[component][consumed_codes < 0][0]])
+
+            key = hashlib.blake2b(
+                json.dumps([
+                    component,
+                    [[cvariant, int(self.inventory_allocations[cvariant]), int(self.reorder_points.get(cvariant, -1))] for cvariant in cvariants],
+                    self.travel_time_distributions[station],
+                    last_event_time,
+                ]).encode()
+                + check_digest
+                + start_times[:, idx].tobytes()
+                + consumed_codes.tobytes(),
+                digest_size=16,
+            ).digest()
+            station_result = None if self.station_cache is None else self.station_cache.get(key)
+            if station_result is None:
+                station_result = self.run_station(
+                    allocations=[self.inventory_allocations[cvariant] for cvariant in cvariants],
+                    reorder_levels=[self.reorder_points.get(cvariant, -math.inf) for cvariant in cvariants],
+                    consumption_times=start_times[:, idx],
+                    consumed_codes=consumed_codes,
+                    check_times=check_times,
+                    check_kinds=check_kinds,
+                    travel_time=self.travel_time_distributions[station],
+                    last_event_time=last_event_time,
+                )
+                if self.station_cache is not None:
+                    self.station_cache.put(key, station_result)
+
+            repairs, check_times, check_kinds, check_digest = station_result
+            self.metrics_dict[f'{component}_repairs'] += repairs
+
+    def run_station(
+        self,
+        allocations,
+        reorder_levels,
+        consumption_times,
+        consumed_codes,
+        check_times,
+        check_kinds,
+        travel_time,
+        last_event_time,
+    ):
+        """Simulate one station and return its repairs and the checks it passes on."""
+        available = list(allocations)
+        position = list(allocations)
+        below_reorder = sum(position[code] <= reorder_levels[code] for code in range(len(allocations)))
+        order_outstanding = False
+        repairs = 0
+
+        # Checks at arrivals are ordered with the consumptions, checks after deliveries with the handler events
+        arrival_checks = check_times[check_kinds == 0]
+        event_times = np.concatenate([arrival_checks, consumption_times, [last_event_time]])
+        event_codes = np.concatenate([
+            np.full(len(arrival_checks), -1, dtype=np.int64),
+            consumed_codes,
+            [-2],
+        ])
+        event_order = np.lexsort((np.arange(len(event_times)), event_codes >= 0, event_times))
+
+        handler_events = [(now, sequence, 'check', None) for sequence, now in enumerate(check_times[check_kinds == 1].tolist())]
+        handler_sequence = len(handler_events)
+        passed_times = []
+        passed_kinds = []
+
+        def check(now, kind):
+            """Order if the station is due, or pass the check on to the next station."""
+            nonlocal handler_sequence, order_outstanding
+            if not order_outstanding and below_reorder:
+                order_outstanding = True
+                heapq.heappush(handler_events, (now, handler_sequence, 'pickup', None))
+                handler_sequence += 1
+            else:
+                passed_times.append(now)
+                passed_kinds.append(kind)
+
+        for event_time, event_code in zip(event_times[event_order].tolist(), event_codes[event_order].tolist()):
+            while handler_events and handler_events[0][0] < event_time:
+                now, _, handler_event, orders = heapq.heappop(handler_events)
+                if handler_event == 'check':
+                    check(now, 1)
+                elif handler_event == 'pickup':
+                    # The handler picked up the order, so size it and send it out
+                    orders = []
+                    for code in range(len(allocations)):
+                        if position[code] <= reorder_levels[code]:
+                            orders.append((code, allocations[code] - available[code]))
+                    for code, ordered_amount in orders:
+                        position[code] += ordered_amount
+                    below_reorder = sum(position[code] <= reorder_levels[code] for code in range(len(allocations)))
+                    heapq.heappush(handler_events, (now + travel_time, handler_sequence, 'delivery', orders))
+                    handler_sequence += 1
+                else:
+                    # The order arrived, so the check that placed it moves on
+                    for code, ordered_amount in orders:
+                        available[code] += ordered_amount
+                    order_outstanding = False
+                    passed_times.append(now)
+                    passed_kinds.append(1)
+
+            if event_code == -1:
+                check(event_time, 0)
+            elif event_code >= 0:
+                if available[event_code] == 0:
+                    repairs += 1
+                else:
+                    available[event_code] -= 1
+                    position[event_code] -= 1
+                    if position[event_code] == reorder_levels[event_code]:
+                        below_reorder += 1
+
+        passed_times = np.array(passed_times)
+        passed_kinds = np.array(passed_kinds, dtype=np.int8)
+        passed_digest = hashlib.blake2b(passed_times.tobytes() + passed_kinds.tobytes(), digest_size=16).digest()
+        return repairs, passed_times, passed_kinds, passed_digest
+
+# The following section defines a container for the production data. Grouping the vehicles by day
+# and encoding the variants takes longer than simulating with the fast engine, so it is done once
+# per dataset and reused by every call to `run_simulation`.
+
+class ProductionDataset:
+    components = ['CA', 'CB', 'CC', 'CD', 'CE']
+    path = None
+
+    def __init__(self, production_data):
+        production_data = production_data.sort('day', maintain_order=True)
+        day_column = production_data['day'].to_numpy()
+
+        self.days = np.unique(day_column)
+        self.day_offsets = np.append(np.searchsorted(day_column, self.days), len(day_column))
+        self.variant_labels = {}
+        self.variant_codes = {}
+        for component in self.components:
+            labels, codes = np.unique(production_data[component].to_numpy(), return_inverse=True)
+            assert len(labels) <= 256, f'Component {component} has too many variants to encode'
+            self.variant_labels[component] = labels.tolist()
+            self.variant_codes[component] = np.ascontiguousarray(codes.reshape(-1), dtype=np.uint8)
+
+    @classmethod
+    def from_csv(cls, source):
+        """Read the production data from a CSV file or URL."""
+        import polars as pl
+        return cls(pl.read_csv(source))
+
+    def save(self, path):
+        """Write the dataset as a directory of .npy arrays that can be memory-mapped."""
+        temporary_path = f'{path}.tmp'
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        os.makedirs(temporary_path)
+        np.save(os.path.join(temporary_path, 'days.npy'), self.days)
+        np.save(os.path.join(temporary_path, 'day_offsets.npy'), self.day_offsets)
+        for component in self.components:
+            np.save(os.path.join(temporary_path, f'{component}.npy'), self.variant_codes[component])
+        with open(os.path.join(temporary_path, 'variant_labels.json'), 'w') as labels_file:
+            json.dump(self.variant_labels, labels_file)
+
+        # Swap the finished directory in so readers never see a partial cache
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a dataset written by save without copying its arrays."""
+        dataset = cls.__new__(cls)
+        dataset.path = os.path.abspath(path)
+        dataset.days = np.load(os.path.join(path, 'days.npy'), mmap_mode='r')
+        dataset.day_offsets = np.load(os.path.join(path, 'day_offsets.npy'), mmap_mode='r')
+        dataset.variant_codes = {
+            component: np.load(os.path.join(path, f'{component}.npy'), mmap_mode='r')
+            for component in cls.components
+        }
+        with open(os.path.join(path, 'variant_labels.json')) as labels_file:
+            dataset.variant_labels = json.load(labels_file)
+        return dataset
+
+    def __len__(self):
+        return int(self.day_offsets[-1])
+
+    def fingerprint(self):
+        """Return a hash of the dataset contents, used to key cached evaluations."""
+        if getattr(self, '_fingerprint', None) is None:
+            digest = hashlib.sha256()
+            digest.update(np.ascontiguousarray(self.days, dtype=np.int64).tobytes())
+            digest.update(np.ascontiguousarray(self.day_offsets, dtype=np.int64).tobytes())
+            for component in self.components:
+                digest.update(json.dumps(self.variant_labels[component]).encode())
+                digest.update(np.ascontiguousarray(self.variant_codes[component]).tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def day_variants(self, day):
+        """Return the variant codes of each component for the vehicles produced on a day."""
+        idx = np.searchsorted(self.days, day)
+        if idx == len(self.days) or self.days[idx] != day:
+            raise KeyError(day)
+        start, end = self.day_offsets[idx], self.day_offsets[idx + 1]
+        return {component: self.variant_codes[component][start:end] for component in self.components}
+
+def load_production_dataset(source, cache_path):
+    """Load the memory-mapped cache at cache_path, converting source into it first if needed."""
+    stale = (
+        not os.path.isdir(cache_path)
+        or (os.path.exists(source) and os.path.getmtime(source) > os.path.getmtime(cache_path))
+    )
+    if stale:
+        ProductionDataset.from_csv(source).save(cache_path)
+    return ProductionDataset.load(cache_path)
+
+_loaded_datasets = {}
+
+def _load_worker_dataset(path):
+    """Map a cached dataset once per worker process."""
+    if path not in _loaded_datasets:
+        _loaded_datasets[path] = ProductionDataset.load(path)
+    return _loaded_datasets[path]
+
+# The following section defines a cache of simulation results. The neighbor moves used in the
+# optimization often return to a configuration that was already simulated, so results are kept by a
+# hash of everything that determines them. A run is stored as its array of daily repair counts, from
+# which the costs are computed again when it is read. The most recently used entries are kept in
+# memory and, when a path is given, every entry is also stored in a SQLite file that later runs can
+# reuse.
+
+def candidate_key(
+    production_data,
+    component_assignments,
+    inventory_allocations,
+    reorder_points,
+    num_handlers,
+    space_available,
+    day_start,
+    day_end,
+    seed,
+):
+    """Return a canonical hash of a simulation run's inputs."""
+    candidate = {
+        'production_data': production_data.fingerprint(),
+        'component_assignments': component_assignments,
+        'inventory_allocations': {cvariant: operator.index(callocation) for cvariant, callocation in inventory_allocations.items()},
+        'reorder_points': {cvariant: operator.index(creorder_point) for cvariant, creorder_point in reorder_points.items()},
+        'num_handlers': num_handlers,
+        'space_available': space_available,
+        'day_start': day_start,
+        'day_end': day_end,
+        'seed': seed,
+    }
+    return hashlib.sha256(json.dumps(candidate, sort_keys=True).encode()).hexdigest()
+
+class EvaluationCache:
+    def __init__(self, max_entries=4096, path=None):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.connection = None
+        if path is not None:
+            self.connection = sqlite3.connect(path)
+            self.connection.execute('CREATE TABLE IF NOT EXISTS evaluations (key TEXT PRIMARY KEY, metrics TEXT)')
+            self.connection.commit()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def items(self):
+        """Return the (key, daily repair counts) pairs held in memory, least recently used first."""
+        return list(self.entries.items())
+
+    def get(self, key):
+        """Return the metrics stored under key, or None."""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return SimulationMetrics.from_counts(self.entries[key].copy())
+
+        if self.connection is not None:
+            row = self.connection.execute('SELECT metrics FROM evaluations WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                all_counts = json.loads(row[0])
+                if all_counts and isinstance(all_counts[0], dict):
+                    # Files written before the counts were stored hold one dict per day
+                    all_counts = SimulationMetrics(all_counts).counts
+                self._remember(key, np.array(all_counts, dtype=np.int64).reshape(-1, len(SimulationMetrics.count_columns)))
+                self.hits += 1
+                return SimulationMetrics.from_counts(self.entries[key].copy())
+
+        self.misses += 1
+        return None
+
+    def put(self, key, simulation_metrics):
+        """Store the daily repair counts of a run under key."""
+        if not isinstance(simulation_metrics, SimulationMetrics):
+            simulation_metrics = SimulationMetrics(simulation_metrics)
+        all_counts = simulation_metrics.counts[:len(simulation_metrics)].copy()
+        self._remember(key, all_counts)
+        if self.connection is not None:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO evaluations (key, metrics) VALUES (?, ?)',
+                (key, json.dumps(all_counts.tolist())),
+            )
+            self.connection.commit()
+
+    def _remember(self, key, all_counts):
+        self.entries[key] = all_counts
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+# The following section defines a Parquet sink for the daily metrics of large sweeps. Every run is
+# stored under its candidate hash, and the rows are buffered and written as numbered part files, so
+# the sink can be appended to across runs. Each part is written to a temporary file first, so
+# readers never see a partial one. The whole sink can be scanned lazily with polars.
+
+class MetricsSink:
+    def __init__(self, path, rows_per_file=100000):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.rows_per_file = rows_per_file
+        self.frames = []
+        self.rows = 0
+        self.parts = sum(file_name.endswith('.parquet') for file_name in os.listdir(path))
+
+    def append(self, key, simulation_metrics):
+        """Buffer the daily metrics of a run under its candidate hash."""
+        import polars as pl
+        frame = simulation_metrics.to_polars()
+        self.frames.append(frame.select(pl.lit(key).alias('candidate'), pl.all()))
+        self.rows += len(frame)
+        if self.rows >= self.rows_per_file:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered rows as a new part file."""
+        if not self.frames:
+            return
+        import polars as pl
+        part_path = os.path.join(self.path, f'part-{self.parts:05d}.parquet')
+        pl.concat(self.frames).write_parquet(f'{part_path}.tmp')
+        os.replace(f'{part_path}.tmp', part_path)
+        self.parts += 1
+        self.frames = []
+        self.rows = 0
+
+    def scan(self):
+        """Flush the buffer and lazily scan every stored run."""
+        import polars as pl
+        self.flush()
+        return pl.scan_parquet(os.path.join(self.path, '*.parquet'))
+
+# The following section defines functions to run the simulation model. Days do not share any state,
+# so `run_simulation` can spread them across a pool of worker processes when `workers` is greater
+# than one. Each day draws its arrivals and travel times from its own random number generator,
+# derived from `seed` and the day number, so the results do not depend on how the days are split or
+# in which order they run. Daily costs are never negative, so when a `cost_bound` is given the run
+# stops as soon as its running cost exceeds the bound and the returned metrics are flagged with
+# `terminated_early`. A `station_cache` is only used by serial runs, since the pool workers cannot
+# share it.
+
+def simulate_day(
+    day,
+    day_variants,
+    variant_labels,
+    component_assignments,
+    inventory_allocations,
+    reorder_points,
+    num_handlers=1,
+    seed=0,
+    engine='simpy',
+    instrument=False,
+    station_cache=None,
+) -> dict:
+    """Simulate a single day of production with the 'simpy', 'fast' or 'stations' engine and return its metrics.
+
+    The 'fast' engine switches to 'stations' when there is at least one handler per station, which reuses the station results kept in `station_cache`, if given. With `instrument`, the SimPy engine also returns the day's instrumentation record under 'trace'."""
+    assert engine in ('simpy', 'fast', 'stations'), f'Unknown simulation engine {engine}'
+    assert not instrument or engine == 'simpy', 'Only the SimPy engine is instrumented'
+    started_at = time.perf_counter()
+    if engine == 'fast' and num_handlers >= len(component_assignments):
+        engine = 'stations'
+    rng = day_rng(seed, day)
+    arrival_times = sample_arrival_times(len(day_variants['CA']), rng)
+
+    metrics_dict = {
+        'CA_repairs': 0,
+        'CB_repairs': 0,
+        'CC_repairs': 0,
+        'CD_repairs': 0,
+        'CE_repairs': 0,
+    }
+
+    if engine in ('fast', 'stations'):
+        production_system_kwargs = {'station_cache': station_cache} if engine == 'stations' else {}
+        production_system = (FastProductionSystem if engine == 'fast' else StationProductionSystem)(
+            num_handlers=num_handlers,
+            component_assignments=component_assignments,
+            inventory_allocations=inventory_allocations,
+            reorder_points=reorder_points,
+            metrics_dict=metrics_dict,
+            rng=rng,
+            **production_system_kwargs,
+        )
+        production_system.run(arrival_times.tolist(), day_variants, variant_labels)
+    else:
+        vehicle_info_zip = zip(
+            arrival_times,
+            *(
+                [variant_labels[component][code] for code in day_variants[component].tolist()]
+                for component in ProductionDataset.components
+            ),
+        )
+
+        vehicle_information = {}
+        for vehicle, (arrival_time, CA, CB, CC, CD, CE) in enumerate(vehicle_info_zip, 1):
+            vehicle_information[vehicle] = {
+                'arrival_time': float(arrival_time),
+                'CA': CA,
+                'CB': CB,
+                'CC': CC,
+                'CD': CD,
+                'CE': CE,
+            }
+
+        # Setup the simulation environment
+        import simpy
+        env = simpy.Environment()
+
+        # Create resources for each station (assuming each station can handle one item at a time)
+        stations = {f'Station {idx}': simpy.Resource(env, capacity=1) for idx in range(1, 6)}
+        handlers = simpy.Resource(env, capacity=num_handlers)
+
+        # Create the production system
+        instruments = ProductionInstruments(stations, inventory_allocations) if instrument else None
+        production_system = ProductionSystem(
+            env,
+            handlers=handlers,
+            stations=stations,
+            component_assignments=component_assignments,
+            inventory_allocations=inventory_allocations,
+            reorder_points=reorder_points,
+            metrics_dict=metrics_dict,
+            rng=rng,
+            instruments=instruments,
+        )
+
+        # Generate arrivals based on interarrival times
+        env.process(generate_arrivals(env, production_system, vehicle_information))
+
+        # Run the simulation, counting its events when instrumented
+        if instruments is None:
+            env.run()
+        else:
+            while env.peek() < math.inf:
+                env.step()
+                instruments.events += 1
+
+    run_metrics = dict(metrics_dict)
+    run_metrics.update({
+        'day': day,
+        'num_handlers': num_handlers,
+    })
+    add_day_costs(run_metrics)
+    if instrument:
+        instruments.wall_time = time.perf_counter() - started_at
+        run_metrics['trace'] = instruments.record(day, num_handlers, env.now)
+
+    return run_metrics
+
+def sample_arrival_times(day_vehicle_count, rng, minutes_available=960):
+    """Draw the arrival times of a day's vehicles, spread over the available minutes."""
+    arrival_random_numbers = rng.uniform(
+        low=0.4,
+        high=0.6,
+        size=day_vehicle_count,
+    )
+    arrival_random_numbers_cumsum = arrival_random_numbers.cumsum()
+    arrival_random_numbers_cumsum_normalized = (
+        arrival_random_numbers_cumsum/arrival_random_numbers_cumsum.max()
+    )
+    return minutes_available*arrival_random_numbers_cumsum_normalized
+
+def add_day_costs(run_metrics, minutes_available=960):
+    """Add the repair, material handling and total costs to a day's repair counts.
+
+    The counts may also be NumPy arrays holding one value per candidate policy."""
+    repair_wage_rate = 45
+    tugger_wage_rate = 30
+
+    repair_times = {
+        'CA': 10,
+        'CB': 8,
+        'CC': 12,
+        'CD': 4,
+        'CE': 8,
+    }
+
+    run_metrics['CA_repair_costs'] = repair_wage_rate*((run_metrics['CA_repairs']*repair_times['CA'])/60)
+    run_metrics['CB_repair_costs'] = repair_wage_rate*((run_metrics['CB_repairs']*repair_times['CB'])/60)
+    run_metrics['CC_repair_costs'] = repair_wage_rate*((run_metrics['CC_repairs']*repair_times['CC'])/60)
+    run_metrics['CD_repair_costs'] = repair_wage_rate*((run_metrics['CD_repairs']*repair_times['CD'])/60)
+    run_metrics['CE_repair_costs'] = repair_wage_rate*((run_metrics['CE_repairs']*repair_times['CE'])/60)
+    run_metrics['MH_costs'] = (minutes_available/60)*run_metrics['num_handlers']*tugger_wage_rate
+    run_metrics['Total_repair_costs'] = (
+        run_metrics['CA_repair_costs']
+        + run_metrics['CB_repair_costs']
+        + run_metrics['CC_repair_costs']
+        + run_metrics['CD_repair_costs']
+        + run_metrics['CE_repair_costs']
+    )
+    run_metrics['Total_costs'] = run_metrics['MH_costs'] + run_metrics['Total_repair_costs']
+    return run_metrics
+
+def validate_policy(component_assignments, inventory_allocations, reorder_points, space_available):
+    """Assert that a station assignment and inventory policy are feasible."""
+    assigned_components_list = sorted(list(component_assignments.values()))
+    assert assigned_components_list == ['CA', 'CB', 'CC', 'CD', 'CE'], "You need to assign each component to a single station"
+
+    total_component_allocations = {
+        'CA': 0,
+        'CB': 0,
+        'CC': 0,
+        'CD': 0,
+        'CE': 0,
+    }
+    for cvariant, callocation in inventory_allocations.items():
+        assert isinstance(callocation, numbers.Integral) and not isinstance(callocation, bool), f'Inventory allocation must be an integer for {cvariant}'
+        if cvariant.startswith('CA'):
+            total_component_allocations['CA'] += callocation
+        if cvariant.startswith('CB'):
+            total_component_allocations['CB'] += callocation
+        if cvariant.startswith('CC'):
+            total_component_allocations['CC'] += callocation
+        if cvariant.startswith('CD'):
+            total_component_allocations['CD'] += callocation
+        if cvariant.startswith('CE'):
+            total_component_allocations['CE'] += callocation
+
+    for ccomponent, ctotal_allocation in total_component_allocations.items():
+        assert ctotal_allocation <= space_available, f'You are allocating more than {space_available} units for variants of component {ccomponent}'
+
+    for cvariant, creorder_point in reorder_points.items():
+        assert isinstance(creorder_point, numbers.Integral) and not isinstance(creorder_point, bool), f'Reorder point must be an integer for {cvariant}'
+        assert reorder_points[cvariant] < inventory_allocations[cvariant], f'Reorder point must be less than inventory allocation for {cvariant}'
+        assert reorder_points[cvariant] >= 0, f'Reorder point must be greater than or equal to zero for {cvariant}'
+
+class SimulationMetrics:
+    """Daily metrics of a run, stored as preallocated columns and flagged when the run stopped at its cost bound.
+
+    Only the repair counts are stored, and the costs are computed for all days at once when first read."""
+    count_columns = ['CA_repairs', 'CB_repairs', 'CC_repairs', 'CD_repairs', 'CE_repairs', 'day', 'num_handlers']
+    terminated_early = False
+
+    def __init__(self, all_metrics=(), days=0):
+        all_metrics = list(all_metrics)
+        self.counts = np.zeros((max(days, len(all_metrics)), len(self.count_columns)), dtype=np.int64)
+        self.size = 0
+        self.costs = None
+        for run_metrics in all_metrics:
+            self.append(run_metrics)
+
+    @classmethod
+    def from_counts(cls, counts):
+        """Wrap an array with one row of `count_columns` per day, without copying it."""
+        simulation_metrics = cls()
+        simulation_metrics.counts = counts
+        simulation_metrics.size = len(counts)
+        return simulation_metrics
+
+    def append(self, run_metrics):
+        """Add the repair counts of a day."""
+        if self.size == len(self.counts):
+            self.counts = np.resize(self.counts, (max(1, 2*self.size), len(self.count_columns)))
+        self.counts[self.size] = [run_metrics[column] for column in self.count_columns]
+        self.size += 1
+        self.costs = None
+
+    def columns(self):
+        """Return every metric as an array with one value per day."""
+        if self.costs is None:
+            self.costs = add_day_costs({
+                column: self.counts[:self.size, idx] for idx, column in enumerate(self.count_columns)
+            })
+        return self.costs
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.columns()[key]
+        if isinstance(key, slice):
+            return SimulationMetrics(self[idx] for idx in range(*key.indices(self.size)))
+        return {column: values[key].item() for column, values in self.columns().items()}
+
+    def __iter__(self):
+        for idx in range(self.size):
+            yield self[idx]
+
+    def total_cost(self):
+        """Return the total cost over all days."""
+        return self['Total_costs'].sum().item()
+
+    def to_pandas(self):
+        import pandas as pd
+        return pd.DataFrame(self.columns())
+
+    def to_polars(self):
+        import polars as pl
+        return pl.DataFrame(self.columns())
+
+def _simulate_day_task(task, dataset_path=None, **simulation_kwargs):
+    """Unpack a (day, day_variants) task for a pool worker."""
+    day, day_variants = task
+    if day_variants is None:
+        day_variants = _load_worker_dataset(dataset_path).day_variants(day)
+    return simulate_day(day, day_variants, **simulation_kwargs)
+
+def run_simulation(
+    production_data,
+    component_assignments,
+    inventory_allocations,
+    reorder_points,
+    num_handlers=1,
+    day_start=1,
+    day_end=90,
+    space_available=100,
+    workers=1,
+    engine='simpy',
+    seed=0,
+    cache=None,
+    cost_bound=None,
+    progress=True,
+    sink=None,
+    trace=None,
+    station_cache=None,
+) -> SimulationMetrics:
+
+    validate_policy(component_assignments, inventory_allocations, reorder_points, space_available)
+    assert workers >= 1, 'You need at least one worker'
+
+    if not isinstance(production_data, ProductionDataset):
+        production_data = ProductionDataset(production_data)
+
+    if cache is not None or sink is not None:
+        cache_key = candidate_key(
+            production_data,
+            component_assignments,
+            inventory_allocations,
+            reorder_points,
+            num_handlers,
+            space_available,
+            day_start,
+            day_end,
+            seed,
+        )
+    if cache is not None and trace is None:
+        # A cached run has no trace, so instrumented runs are always simulated
+        cached_metrics = cache.get(cache_key)
+        if cached_metrics is not None:
+            return cached_metrics
+
+    simulation_kwargs = {
+        'variant_labels': production_data.variant_labels,
+        'component_assignments': component_assignments,
+        'inventory_allocations': inventory_allocations,
+        'reorder_points': reorder_points,
+        'num_handlers': num_handlers,
+        'seed': seed,
+        'engine': engine,
+        'instrument': trace is not None,
+    }
+    days = range(day_start, day_end + 1)
+    description = f'Simulating {day_end + 1 -day_start} days'
+
+    all_metrics = SimulationMetrics(days=len(days))
+    running_cost = 0
+    if workers == 1:
+        for day in _progress_bar(days, description, disable=not progress):
+            run_metrics = simulate_day(day, production_data.day_variants(day), station_cache=station_cache, **simulation_kwargs)
+            if trace is not None:
+                trace.append(run_metrics.pop('trace'))
+            all_metrics.append(run_metrics)
+            running_cost += run_metrics['Total_costs']
+            if cost_bound is not None and running_cost > cost_bound:
+                all_metrics.terminated_early = True
+                break
+    else:
+        # Workers map a cached dataset themselves instead of receiving copies of each day
+        tasks = [
+            (day, production_data.day_variants(day) if production_data.path is None else None)
+            for day in days
+        ]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for run_metrics in _progress_bar(
+                executor.map(
+                    partial(_simulate_day_task, dataset_path=production_data.path, **simulation_kwargs),
+                    tasks,
+                    chunksize=max(1, len(tasks)//(4*workers)),
+                ),
+                description,
+                total=len(tasks),
+                disable=not progress,
+            ):
+                if trace is not None:
+                    trace.append(run_metrics.pop('trace'))
+                all_metrics.append(run_metrics)
+                running_cost += run_metrics['Total_costs']
+                if cost_bound is not None and running_cost > cost_bound:
+                    all_metrics.terminated_early = True
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    break
+
+    if cache is not None and not all_metrics.terminated_early:
+        cache.put(cache_key, all_metrics)
+    if sink is not None and not all_metrics.terminated_early:
+        sink.append(cache_key, all_metrics)
+
+    return all_metrics
+
+def simulate_day_batch(
+    day,
+    day_variants,
+    variant_labels,
+    component_assignments,
+    candidates,
+    num_handlers=1,
+    seed=0,
+):
+    """Simulate a single day for several candidate policies and return their total costs."""
+    rng = day_rng(seed, day)
+    arrival_times = sample_arrival_times(len(day_variants['CA']), rng)
+
+    metrics_dict = {
+        'CA_repairs': 0,
+        'CB_repairs': 0,
+        'CC_repairs': 0,
+        'CD_repairs': 0,
+        'CE_repairs': 0,
+    }
+    production_system = BatchProductionSystem(
+        num_handlers=num_handlers,
+        component_assignments=component_assignments,
+        candidates=candidates,
+        metrics_dict=metrics_dict,
+        rng=rng,
+    )
+    production_system.run(arrival_times.tolist(), day_variants, variant_labels)
+
+    metrics_dict['num_handlers'] = num_handlers
+    return add_day_costs(metrics_dict)['Total_costs']
+
+def _simulate_day_batch_task(task, dataset_path=None, **simulation_kwargs):
+    """Unpack a (day, day_variants) task for a pool worker."""
+    day, day_variants = task
+    if day_variants is None:
+        day_variants = _load_worker_dataset(dataset_path).day_variants(day)
+    return simulate_day_batch(day, day_variants, **simulation_kwargs)
+
+def run_simulation_batch(
+    production_data,
+    component_assignments,
+    candidates,
+    num_handlers=1,
+    day_start=1,
+    day_end=90,
+    space_available=100,
+    seed=0,
+    workers=1,
+    progress=True,
+):
+    """Simulate a list of (inventory_allocations, reorder_points) candidates together.
+
+    Returns a candidates by days array of total costs, equal to what run_simulation reports for each candidate."""
+    assert len(candidates) > 0, 'You need at least one candidate'
+    for inventory_allocations, reorder_points in candidates:
+        validate_policy(component_assignments, inventory_allocations, reorder_points, space_available)
+        assert inventory_allocations.keys() == candidates[0][0].keys(), 'All candidates need to allocate the same variants'
+    assert workers >= 1, 'You need at least one worker'
+
+    if not isinstance(production_data, ProductionDataset):
+        production_data = ProductionDataset(production_data)
+
+    simulation_kwargs = {
+        'variant_labels': production_data.variant_labels,
+        'component_assignments': component_assignments,
+        'candidates': candidates,
+        'num_handlers': num_handlers,
+        'seed': seed,
+    }
+    days = range(day_start, day_end + 1)
+    description = f'Simulating {len(candidates)} candidates for {len(days)} days'
+
+    total_costs = np.empty((len(candidates), len(days)))
+    if workers == 1:
+        for day_idx, day in enumerate(_progress_bar(days, description, disable=not progress)):
+            total_costs[:, day_idx] = simulate_day_batch(day, production_data.day_variants(day), **simulation_kwargs)
+    else:
+        tasks = [
+            (day, production_data.day_variants(day) if production_data.path is None else None)
+            for day in days
+        ]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            day_costs = executor.map(
+                partial(_simulate_day_batch_task, dataset_path=production_data.path, **simulation_kwargs),
+                tasks,
+                chunksize=max(1, len(tasks)//(4*workers)),
+            )
+            for day_idx, costs in enumerate(_progress_bar(day_costs, description, total=len(tasks), disable=not progress)):
+                total_costs[:, day_idx] = costs
+
+    return total_costs
+
+# The following section defines a streaming version of `run_simulation`, for production histories
+# too large to hold in memory. The CSV or Parquet file is scanned lazily with polars and read in
+# chunks. Every day is simulated as soon as all its rows have arrived, and its metrics are yielded
+# right away. Only one day's vehicles and one chunk are held at a time. The rows must be ordered by
+# day, as they are when production is appended day after day. `compute_total_cost` sums the records
+# as they come, so it can consume the stream directly.
+
+def scan_production_data(source):
+    """Lazily scan production data from a CSV or Parquet file."""
+    import polars as pl
+    if str(source).endswith('.parquet'):
+        return pl.scan_parquet(source)
+    return pl.scan_csv(source)
+
+def iter_production_days(source, day_start=None, day_end=None, chunk_size=10000):
+    """Yield each day and its rows as a ProductionDataset, reading the source in chunks."""
+    import polars as pl
+    production_data = source if isinstance(source, pl.LazyFrame) else scan_production_data(source)
+    if day_start is not None:
+        production_data = production_data.filter(pl.col('day') >= day_start)
+    if day_end is not None:
+        production_data = production_data.filter(pl.col('day') <= day_end)
+
+    current_day = None
+    day_rows = []
+    for chunk in production_data.collect_batches(chunk_size=chunk_size):
+        for rows in chunk.partition_by('day', maintain_order=True):
+            day = rows['day'][0]
+            if day != current_day:
+                if day_rows:
+                    yield current_day, ProductionDataset(pl.concat(day_rows))
+                assert current_day is None or day > current_day, f'Production data must be ordered by day, found day {day} after day {current_day}'
+                current_day = day
+                day_rows = []
+            day_rows.append(rows)
+    if day_rows:
+        yield current_day, ProductionDataset(pl.concat(day_rows))
+
+def stream_simulation(
+    source,
+    component_assignments,
+    inventory_allocations,
+    reorder_points,
+    num_handlers=1,
+    day_start=None,
+    day_end=None,
+    space_available=100,
+    engine='fast',
+    seed=0,
+    chunk_size=10000,
+):
+    """Simulate the days of a lazily scanned source one at a time, yielding each day's metrics."""
+    validate_policy(component_assignments, inventory_allocations, reorder_points, space_available)
+    for day, day_data in iter_production_days(source, day_start, day_end, chunk_size):
+        yield simulate_day(
+            day,
+            day_data.day_variants(day),
+            day_data.variant_labels,
+            component_assignments=component_assignments,
+            inventory_allocations=inventory_allocations,
+            reorder_points=reorder_points,
+            num_handlers=num_handlers,
+            seed=seed,
+            engine=engine,
+        )
+
+# The following section defines an incremental evaluation of neighbor solutions. A neighbor changes
+# the allocation and reorder point of a few variants by the same amount, so their stock and
+# inventory position are shifted by a constant, and whether they are at or below their reorder point
+# does not change. Until a changed variant runs out at a different consumption, the handlers are
+# dispatched exactly as for the incumbent. `DeltaEvaluator` keeps, for each day of the incumbent,
+# the time of every handler pickup and delivery and the consumption times of every variant. A
+# neighbor is evaluated by replaying only its changed variants against the incumbent's handler log.
+# If a changed variant reaches its reorder point at a different time than in the incumbent, the
+# handler timing changes, and that day is simulated again in full.
+
+def replay_variant(allocation, reorder_level, consumption_times, handler_log):
+    """Step one variant's stock through a station's handler log and return its repairs and reorder-point times."""
+    available = allocation
+    position = allocation
+    ordered_amount = 0
+    repairs = 0
+    reorder_times = []
+    consumption = 0
+    for now, delivered in handler_log + [(math.inf, None)]:
+        # Consumptions at the same time as a handler event happen first
+        while consumption < len(consumption_times) and consumption_times[consumption] <= now:
+            if available == 0:
+                repairs += 1
+            else:
+                available -= 1
+                position -= 1
+                if position == reorder_level:
+                    reorder_times.append(consumption_times[consumption])
+            consumption += 1
+
+        if delivered:
+            available += ordered_amount
+        elif position <= reorder_level:
+            ordered_amount = allocation - available
+            position += ordered_amount
+        else:
+            ordered_amount = 0
+    return repairs, reorder_times
+
+class DeltaEvaluator:
+    def __init__(self, production_data, component_assignments, num_handlers=1, day_start=1, day_end=90, seed=0):
+        if not isinstance(production_data, ProductionDataset):
+            production_data = ProductionDataset(production_data)
+        self.production_data = production_data
+        self.component_assignments = component_assignments
+        self.num_handlers = num_handlers
+        self.days = range(day_start, day_end + 1)
+        self.seed = seed
+        self.inventory_allocations = None
+        self.reorder_points = None
+        self.day_traces = None
+        self.consumption_times = {}
+        self.last_evaluation = None
+        self.replayed_days = 0
+        self.simulated_days = 0
+
+    def simulate_day(self, day, inventory_allocations, reorder_points):
+        """Simulate one day with the fast engine and return its metrics and handler log."""
+        rng = day_rng(self.seed, day)
+        day_variants = self.production_data.day_variants(day)
+        arrival_times = sample_arrival_times(len(day_variants['CA']), rng)
+        metrics_dict = {f'{component}_repairs': 0 for component in ProductionDataset.components}
+        production_system = FastProductionSystem(
+            num_handlers=self.num_handlers,
+            component_assignments=self.component_assignments,
+            inventory_allocations=inventory_allocations,
+            reorder_points=reorder_points,
+            metrics_dict=metrics_dict,
+            rng=rng,
+        )
+        production_system.run(arrival_times.tolist(), day_variants, self.production_data.variant_labels)
+        self.simulated_days += 1
+
+        if day not in self.consumption_times:
+            self.consumption_times[day] = {
+                cvariant: production_system.start_times[
+                    production_system.consumed_codes[:, idx] == code, idx
+                ].tolist()
+                for cvariant, code in production_system.variant_codes.items()
+                for idx, station in enumerate(production_system.stations)
+                if cvariant.startswith(self.component_assignments[station])
+            }
+
+        run_metrics = dict(metrics_dict)
+        run_metrics.update({
+            'day': day,
+            'num_handlers': self.num_handlers,
+        })
+        add_day_costs(run_metrics)
+        return run_metrics, production_system.handler_log
+
+    def set_incumbent(self, inventory_allocations, reorder_points):
+        """Make a policy the incumbent and return its metrics, reusing the last evaluation when it was this policy."""
+        if self.last_evaluation is not None and self.last_evaluation[:2] == (inventory_allocations, reorder_points):
+            self.day_traces = self.last_evaluation[2]
+        else:
+            self.day_traces = [self.simulate_day(day, inventory_allocations, reorder_points) for day in self.days]
+        self.inventory_allocations = dict(inventory_allocations)
+        self.reorder_points = dict(reorder_points)
+        self.last_evaluation = None
+        return SimulationMetrics(run_metrics for run_metrics, _ in self.day_traces)
+
+    def evaluate(self, inventory_allocations, reorder_points):
+        """Return the daily metrics of a policy, replaying only the variants that differ from the incumbent."""
+        changed_variants = [
+            cvariant for cvariant in inventory_allocations
+            if inventory_allocations[cvariant] != self.inventory_allocations[cvariant]
+            or reorder_points.get(cvariant) != self.reorder_points.get(cvariant)
+        ]
+        variant_stations = {
+            cvariant: idx
+            for cvariant in changed_variants
+            for idx, station in enumerate(self.component_assignments.values())
+            if cvariant.startswith(station)
+        }
+
+        day_traces = []
+        for day, (incumbent_metrics, handler_log) in zip(self.days, self.day_traces):
+            run_metrics = dict(incumbent_metrics)
+            for cvariant in changed_variants:
+                station_log = handler_log[variant_stations[cvariant]]
+                consumption_times = self.consumption_times[day][cvariant]
+                incumbent_repairs, incumbent_reorder_times = replay_variant(
+                    self.inventory_allocations[cvariant],
+                    self.reorder_points.get(cvariant, -math.inf),
+                    consumption_times,
+                    station_log,
+                )
+                repairs, reorder_times = replay_variant(
+                    inventory_allocations[cvariant],
+                    reorder_points.get(cvariant, -math.inf),
+                    consumption_times,
+                    station_log,
+                )
+                if reorder_times != incumbent_reorder_times:
+                    break
+                run_metrics[f'{cvariant[:2]}_repairs'] += repairs - incumbent_repairs
+            else:
+                self.replayed_days += 1
+                day_traces.append((add_day_costs(run_metrics), handler_log))
+                continue
+            day_traces.append(self.simulate_day(day, inventory_allocations, reorder_points))
+
+        self.last_evaluation = (dict(inventory_allocations), dict(reorder_points), day_traces)
+        return SimulationMetrics(run_metrics for run_metrics, _ in day_traces)
+
+# The following section defines an evaluation over several replications of the 90 days. Replication
+# r > 0 draws the arrivals and travel times of each day from SeedSequence(seed, spawn_key=(r, day)),
+# so its streams are independent of every other replication and of neighbouring seeds. Replication 0
+# keeps the streams of the single run used elsewhere. Every candidate sees the same random numbers
+# as the incumbent in each replication, so their costs are compared through paired differences,
+# which vary much less than the costs themselves. Replications are added until the confidence
+# interval of the mean difference excludes zero or `replications` is reached. The intervals use the
+# normal approximation, so at least `min_replications` are always run.
+
+def confidence_interval(samples, confidence=0.95):
+    """Return the mean of the samples and the half-width of its confidence interval."""
+    mean = float(np.mean(samples))
+    if len(samples) < 2:
+        return mean, math.inf
+    z = NormalDist().inv_cdf((1 + confidence)/2)
+    return mean, z*float(np.std(samples, ddof=1))/math.sqrt(len(samples))
+
+def run_replications(
+    production_data,
+    component_assignments,
+    inventory_allocations,
+    reorder_points,
+    replications=10,
+    min_replications=3,
+    confidence=0.95,
+    incumbent=None,
+    incumbent_costs=None,
+    seed=0,
+    engine='fast',
+    **simulation_kwargs,
+) -> dict:
+    """Estimate the total cost of a policy over replications, stopping once its comparison with the incumbent is decided.
+
+    `incumbent` is an (inventory_allocations, reorder_points) pair, and `incumbent_costs` its total cost per replication. The list is extended in place when more replications are needed, so it can be passed to the next comparison. The daily metrics of the first replication are returned with the costs."""
+    if not isinstance(production_data, ProductionDataset):
+        production_data = ProductionDataset(production_data)
+    if incumbent is not None and incumbent_costs is None:
+        incumbent_costs = []
+
+    def replicate(policy, replication):
+        return run_simulation(
+            production_data=production_data,
+            component_assignments=component_assignments,
+            inventory_allocations=policy[0],
+            reorder_points=policy[1],
+            seed=(seed, replication) if replication else seed,
+            engine=engine,
+            progress=False,
+            **simulation_kwargs,
+        )
+
+    simulation_metrics = replicate((inventory_allocations, reorder_points), 0)
+    total_costs = []
+    differences = []
+    decided = False
+    for replication in range(replications):
+        if replication:
+            total_costs.append(compute_total_cost(replicate((inventory_allocations, reorder_points), replication)))
+        else:
+            total_costs.append(compute_total_cost(simulation_metrics))
+        if incumbent is None:
+            continue
+
+        while len(incumbent_costs) <= replication:
+            incumbent_costs.append(compute_total_cost(replicate(incumbent, len(incumbent_costs))))
+        differences.append(total_costs[-1] - incumbent_costs[replication])
+        difference_mean, difference_ci = confidence_interval(differences, confidence)
+        if len(differences) >= min_replications and abs(difference_mean) > difference_ci:
+            decided = True
+            break
+
+    mean, ci = confidence_interval(total_costs, confidence)
+    results = {
+        'total_costs': total_costs,
+        'mean': mean,
+        'ci': ci,
+        'replications': len(total_costs),
+        'simulation_metrics': simulation_metrics,
+    }
+    if incumbent is not None:
+        results.update({
+            'difference_mean': difference_mean,
+            'difference_ci': difference_ci,
+            'decided': decided,
+        })
+    return results
+
+
+# The next sections define functions used for optimization.
+
+# The following section defines checkpoints of the optimizer. A checkpoint holds the incumbent
+# solution and its cost, the number of completed iterations and evaluations, the state of the random
+# number generator, the observations and rank correlation of the surrogate, and the evaluation cache
+# stored as daily repair counts. It is written to a temporary file that then replaces the previous
+# checkpoint, so a run killed while writing leaves the last complete checkpoint behind. A run given
+# an existing checkpoint continues from it and proposes the same neighbors it would have without the
+# interruption, so it can also be extended by raising `max_iterations`.
+
+def save_checkpoint(path, checkpoint):
+    """Atomically write an optimizer checkpoint as JSON."""
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f'{path}.tmp', path)
+
+def load_checkpoint(path):
+    """Read an optimizer checkpoint, or return None when there is none yet."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    # JSON turns the tuples of the random state into lists
+    version, internal_state, gauss_next = checkpoint['random_state']
+    checkpoint['random_state'] = (version, tuple(internal_state), gauss_next)
+    return checkpoint
+
+def compute_total_cost(simulation_metrics):
+    """Compute the total cost from the simulation results, which may be a stream of daily records."""
+    if isinstance(simulation_metrics, SimulationMetrics):
+        return simulation_metrics.total_cost()
+    total_cost = 0
+    for run_metrics in simulation_metrics:
+        total_cost += run_metrics['Total_costs']
+    return total_cost
+
+def optimize_inventory(
+    inventory_allocations,
+    reorder_points,
+    data,
+    component_assignments,
+    space_available,
+    max_iterations=5000,
+    *,
+    num_handlers=1,
+    seed=0,
+    cache=None,
+    incremental=True,
+    screen_fraction=None,
+    screen_neighbors=8,
+    replications=None,
+    day_start=1,
+    day_end=90,
+    tabu_size=10000,
+    max_evaluations=None,
+    time_limit=None,
+    checkpoint_path=None,
+    checkpoint_interval=100,
+    stats=None,
+    verbose=True,
+):
+    start_time = time.time()
+    best_inventory_allocations = inventory_allocations.copy()
+    best_reorder_points = reorder_points.copy()
+    if not isinstance(data, ProductionDataset):
+        data = ProductionDataset(data)
+    if cache is None:
+        cache = EvaluationCache()
+    station_cache = StationCache()
+    rng = random.Random(seed)
+    start_iteration = 0
+    evaluations = 0
+
+    # A checkpoint can only continue the run it was written by
+    run = {
+        'production_data': data.fingerprint(),
+        'component_assignments': component_assignments,
+        'space_available': space_available,
+        'num_handlers': num_handlers,
+        'seed': seed,
+        'incremental': incremental,
+        'screen_fraction': screen_fraction,
+        'screen_neighbors': screen_neighbors,
+        'replications': replications,
+        'day_start': day_start,
+        'day_end': day_end,
+        'tabu_size': tabu_size,
+    }
+    checkpoint = None if checkpoint_path is None else load_checkpoint(checkpoint_path)
+    if checkpoint is not None:
+        assert checkpoint['run'] == run, f'The checkpoint {checkpoint_path} was written by a different run'
+        best_inventory_allocations = checkpoint['inventory_allocations']
+        best_reorder_points = checkpoint['reorder_points']
+        start_iteration = checkpoint['iteration']
+        evaluations = checkpoint['evaluations']
+        rng.setstate(checkpoint['random_state'])
+        for key, all_counts in checkpoint['cache']:
+            cache.put(key, SimulationMetrics.from_counts(np.array(all_counts, dtype=np.int64).reshape(-1, len(SimulationMetrics.count_columns))))
+        if verbose:
+            print(f"Resuming from iteration {start_iteration} with cost {checkpoint['total_cost']}")
+
+    # Initial total cost
+    if incremental:
+        # Neighbors are replayed against the incumbent instead of simulated from scratch
+        validate_policy(component_assignments, best_inventory_allocations, best_reorder_points, space_available)
+        evaluator = DeltaEvaluator(data, component_assignments, num_handlers=num_handlers, day_start=day_start, day_end=day_end, seed=seed)
+        simulation_metrics = evaluator.set_incumbent(best_inventory_allocations, best_reorder_points)
+    else:
+        simulation_metrics = run_simulation(
+            production_data=data,
+            component_assignments=component_assignments,
+            inventory_allocations=best_inventory_allocations,
+            reorder_points=best_reorder_points,
+            num_handlers=num_handlers,  # You can optimize handlers separately
+            day_start=day_start,
+            day_end=day_end,
+            space_available=space_available,
+            seed=seed,
+            cache=cache,
+            progress=verbose,
+            station_cache=station_cache,
+        )
+    best_total_cost = compute_total_cost(simulation_metrics)
+    incumbent_costs = [best_total_cost]
+    new_simulation_metrics = simulation_metrics
+    if checkpoint is not None:
+        # Over replications the incumbent's cost is a mean, so it is taken from the checkpoint
+        best_total_cost = checkpoint['total_cost']
+        incumbent_costs = checkpoint['incumbent_costs']
+
+    # Only the neighbors the surrogate ranks best are simulated
+    surrogate = None
+    if screen_fraction is not None:
+        surrogate = SurrogateModel(data, component_assignments, num_handlers=num_handlers)
+        if checkpoint is None:
+            surrogate.update(best_inventory_allocations, best_reorder_points, best_total_cost)
+        else:
+            surrogate.features = [np.array(features) for features in checkpoint['surrogate']['features']]
+            surrogate.total_costs = checkpoint['surrogate']['total_costs']
+            surrogate.predictions = checkpoint['surrogate']['predictions']
+            surrogate.weights = np.array(checkpoint['surrogate']['weights'])
+
+    # Neighbors are drawn from the moves that were accepted most often and are never reevaluated
+    neighbor_generator = NeighborGenerator(best_inventory_allocations, tabu_size=tabu_size)
+    if checkpoint is None:
+        neighbor_generator.remember(best_inventory_allocations, best_reorder_points)
+    else:
+        neighbor_generator.tabu = OrderedDict.fromkeys(checkpoint['neighbors']['tabu'])
+        neighbor_generator.evaluations = np.array(checkpoint['neighbors']['evaluations'], dtype=np.int64)
+        neighbor_generator.acceptances = np.array(checkpoint['neighbors']['acceptances'], dtype=np.int64)
+
+    def write_checkpoint(iteration):
+        save_checkpoint(checkpoint_path, {
+            'run': run,
+            'inventory_allocations': best_inventory_allocations,
+            'reorder_points': best_reorder_points,
+            'total_cost': best_total_cost,
+            'incumbent_costs': incumbent_costs,
+            'iteration': iteration,
+            'evaluations': evaluations,
+            'random_state': rng.getstate(),
+            'surrogate': None if surrogate is None else {
+                'features': [features.tolist() for features in surrogate.features],
+                'total_costs': surrogate.total_costs,
+                'predictions': surrogate.predictions,
+                'weights': surrogate.weights.tolist(),
+                'rank_correlation': surrogate.rank_correlation(),
+            },
+            'neighbors': {
+                'tabu': list(neighbor_generator.tabu),
+                'evaluations': neighbor_generator.evaluations.tolist(),
+                'acceptances': neighbor_generator.acceptances.tolist(),
+            },
+            'cache': [
+                [key, all_counts.tolist()]
+                for key, all_counts in cache.items()
+            ],
+        })
+
+    # Optimization loop (using a form of stochastic search or simulated annealing)
+    iteration = start_iteration
+    while iteration < max_iterations:
+        # The budgets are checked between iterations, so a checkpoint never splits one
+        if time_limit is not None and time.time() - start_time >= time_limit:
+            break
+        if max_evaluations is not None and evaluations >= max_evaluations:
+            break
+
+        # Generate distinct neighbor solutions
+        neighbors = []
+        proposed = set()
+        for _ in range(1 if surrogate is None else screen_neighbors):
+            neighbor = neighbor_generator.propose(best_inventory_allocations, best_reorder_points, rng=rng, exclude=proposed)
+            if neighbor is None:
+                break
+            neighbors.append(neighbor)
+            proposed.add(neighbor_generator.policy_hash(*neighbor[1:]))
+        if not neighbors:
+            if verbose:
+                print(f"Iteration {iteration}: Every neighbor has been evaluated")
+            break
+        if surrogate is not None:
+            neighbors.sort(key=lambda neighbor: surrogate.predict(*neighbor[1:]))
+            neighbors = neighbors[:math.ceil(screen_fraction*screen_neighbors)]
+
+        for move, new_inventory_allocations, new_reorder_points in neighbors:
+            # Run the simulation for the new solution
+            evaluations += 1
+            if replications is not None:
+                comparison = run_replications(
+                    production_data=data,
+                    component_assignments=component_assignments,
+                    inventory_allocations=new_inventory_allocations,
+                    reorder_points=new_reorder_points,
+                    replications=replications,
+                    incumbent=(best_inventory_allocations, best_reorder_points),
+                    incumbent_costs=incumbent_costs,
+                    num_handlers=num_handlers,
+                    space_available=space_available,
+                    day_start=day_start,
+                    day_end=day_end,
+                    seed=seed,
+                )
+                new_simulation_metrics = comparison['simulation_metrics']
+            elif incremental:
+                validate_policy(component_assignments, new_inventory_allocations, new_reorder_points, space_available)
+                new_simulation_metrics = evaluator.evaluate(new_inventory_allocations, new_reorder_points)
+            else:
+                new_simulation_metrics = run_simulation(
+                    production_data=data,
+                    component_assignments=component_assignments,
+                    inventory_allocations=new_inventory_allocations,
+                    reorder_points=new_reorder_points,
+                    num_handlers=num_handlers,  # You can also make this dynamic
+                    day_start=day_start,
+                    day_end=day_end,
+                    space_available=space_available,
+                    seed=seed,
+                    cache=cache,
+                    cost_bound=best_total_cost,
+                    progress=verbose,
+                    station_cache=station_cache,
+                )
+
+            # Compute the new total cost, which is only a lower bound when the run stopped early
+            new_total_cost = compute_total_cost(new_simulation_metrics)
+            if surrogate is not None and not new_simulation_metrics.terminated_early:
+                surrogate.update(new_inventory_allocations, new_reorder_points, new_total_cost)
+            if replications is not None:
+                # Over replications a neighbor replaces the incumbent whenever it is decidedly better.
+                # The comparison may have extended incumbent_costs in place, so the incumbent's mean is updated.
+                best_total_cost = confidence_interval(incumbent_costs)[0]
+                accepted = comparison['decided'] and comparison['difference_mean'] < 0
+                new_total_cost = comparison['mean']
+            else:
+                accepted = new_total_cost < best_total_cost
+
+            # Accept the new solution if it's better (you can add probabilistic acceptance to make it simulated annealing)
+            neighbor_generator.record(move, new_inventory_allocations, new_reorder_points, accepted)
+            if accepted:
+                best_inventory_allocations = new_inventory_allocations
+                best_reorder_points = new_reorder_points
+                best_total_cost = new_total_cost
+                if replications is not None:
+                    incumbent_costs = comparison['total_costs']
+                elif incremental:
+                    evaluator.set_incumbent(best_inventory_allocations, best_reorder_points)
+                if verbose:
+                    print(f"Iteration {iteration}: Improved cost to {best_total_cost}")
+
+        iteration += 1
+        if checkpoint_path is not None and iteration % checkpoint_interval == 0:
+            write_checkpoint(iteration)
+
+    if checkpoint_path is not None:
+        write_checkpoint(iteration)
+    rank_correlation = None if surrogate is None else surrogate.rank_correlation()
+    if surrogate is not None and verbose:
+        print(f"Surrogate rank correlation: {rank_correlation:.3f}")
+    if stats is not None:
+        stats.update({
+            'iterations': iteration,
+            'evaluations': evaluations,
+            'move_statistics': neighbor_generator.move_statistics(),
+            'surrogate_rank_correlation': rank_correlation,
+        })
+
+    return best_inventory_allocations, best_reorder_points, best_total_cost, new_simulation_metrics
+
+def get_neighbor_solution(inventory_allocations, reorder_points, rng=random):
+    """Generate a neighbor solution by tweaking inventory allocations or reorder points."""
+    new_inventory_allocations = inventory_allocations.copy()
+    new_reorder_points = reorder_points.copy()
+
+    # Randomly select an inventory items to modify
+    random_item1, random_item2 = 1, 1
+    while random_item1 == random_item2:
+      random_item1 = rng.choice(list(inventory_allocations.keys()))
+      random_item2 = rng.choice([x for x in list(inventory_allocations.keys()) if x[:2] == random_item1[:2]])
+
+      #increase one while decreasing other
+    if new_inventory_allocations[random_item2] > 1:
+        new_reorder_points[random_item1] += 1
+        new_reorder_points[random_item2] -= 1
+        new_inventory_allocations[random_item1] += 1
+        new_inventory_allocations[random_item2] -= 1
+
+
+
+    return new_inventory_allocations, new_reorder_points
+
+# The following section defines an indexed generator of neighbor solutions. The moves, which shift
+# one unit of space and of the reorder point from a donor variant to a receiver variant of the same
+# component, are listed once. Only moves whose donor keeps at least one unit and a nonnegative reorder
+# point are drawn, so every neighbor is a valid policy. The hashes of recently evaluated policies
+# are kept as tabu and are never proposed again. Every move counts how often it was evaluated and
+# accepted, and moves are drawn in proportion to their acceptance rate, starting from one
+# acceptance in two evaluations.
+
+class NeighborGenerator:
+    def __init__(self, variants, tabu_size=10000):
+        self.variants = sorted(variants)
+        variant_index = {cvariant: idx for idx, cvariant in enumerate(self.variants)}
+        component_variants = {}
+        for cvariant in self.variants:
+            component_variants.setdefault(cvariant[:2], []).append(cvariant)
+        self.moves = [
+            (receiver, donor)
+            for cvariants in component_variants.values()
+            for receiver, donor in itertools.permutations(cvariants, 2)
+        ]
+        self.donors = np.array([variant_index[donor] for _, donor in self.moves])
+        self.tabu_size = tabu_size
+        self.tabu = OrderedDict()
+        self.evaluations = np.zeros(len(self.moves), dtype=np.int64)
+        self.acceptances = np.zeros(len(self.moves), dtype=np.int64)
+
+    def policy_hash(self, inventory_allocations, reorder_points):
+        """Return a hash of a policy."""
+        return hash(tuple(
+            (inventory_allocations[cvariant], reorder_points.get(cvariant, -1)) for cvariant in self.variants
+        ))
+
+    def propose(self, inventory_allocations, reorder_points, rng=random, exclude=()):
+        """Return a (move, inventory_allocations, reorder_points) neighbor that is valid and not tabu, or None."""
+        allocations = np.array([inventory_allocations[cvariant] for cvariant in self.variants])
+        reorder_levels = np.array([reorder_points.get(cvariant, 1) for cvariant in self.variants])
+        feasible = (allocations[self.donors] > 1) & (reorder_levels[self.donors] > 0)
+        weights = np.where(feasible, (self.acceptances + 1)/(self.evaluations + 2), 0)
+
+        while weights.sum() > 0:
+            move = rng.choices(range(len(self.moves)), weights=weights.tolist())[0]
+            receiver, donor = self.moves[move]
+            new_inventory_allocations = inventory_allocations.copy()
+            new_reorder_points = reorder_points.copy()
+            new_inventory_allocations[receiver] += 1
+            new_inventory_allocations[donor] -= 1
+            if receiver in new_reorder_points:
+                new_reorder_points[receiver] += 1
+            if donor in new_reorder_points:
+                new_reorder_points[donor] -= 1
+
+            new_hash = self.policy_hash(new_inventory_allocations, new_reorder_points)
+            if new_hash in self.tabu or new_hash in exclude:
+                weights[move] = 0
+                continue
+            return move, new_inventory_allocations, new_reorder_points
+        return None
+
+    def remember(self, inventory_allocations, reorder_points):
+        """Make a policy tabu, forgetting the oldest one when the list is full."""
+        self.tabu[self.policy_hash(inventory_allocations, reorder_points)] = None
+        while len(self.tabu) > self.tabu_size:
+            self.tabu.popitem(last=False)
+
+    def record(self, move, inventory_allocations, reorder_points, accepted):
+        """Record the evaluation of a neighbor produced by move."""
+        self.remember(inventory_allocations, reorder_points)
+        self.evaluations[move] += 1
+        self.acceptances[move] += accepted
+
+    def move_statistics(self):
+        """Return the evaluations and acceptances of every move that was evaluated."""
+        return {
+            move: {'evaluations': int(self.evaluations[idx]), 'acceptances': int(self.acceptances[idx])}
+            for idx, move in enumerate(self.moves)
+            if self.evaluations[idx]
+        }
+
+# The following section defines a surrogate of the total cost, used to pick which neighbor solutions
+# are worth simulating. For every variant it estimates the daily repairs of its reorder-point
+# policy. Its daily demand is the average over the production data. The demand during a station's
+# mean travel time is taken to be Poisson, and the repairs of one order cycle are the expected
+# demand beyond the reorder point. These estimates are priced per component and combined with a
+# linear model. Starting from the analytic weights, the model is refit with ridge regression after
+# every simulation, and it keeps the predictions it made before each simulation to report their rank
+# correlation with the simulated costs. `optimize_inventory` stores that correlation in its
+# checkpoints and in the `stats` dictionary a caller can pass in.
+
+class SurrogateModel:
+    def __init__(self, production_data, component_assignments, num_handlers=1, ridge=1.0, minutes_available=960):
+        if not isinstance(production_data, ProductionDataset):
+            production_data = ProductionDataset(production_data)
+        self.ridge = ridge
+        self.minutes_available = minutes_available
+        self.day_count = len(production_data.days)
+
+        self.daily_demand = {}
+        for component in ProductionDataset.components:
+            labels = production_data.variant_labels[component]
+            counts = np.bincount(production_data.variant_codes[component], minlength=len(labels))
+            for label, count in zip(labels, counts.tolist()):
+                self.daily_demand[label] = count/self.day_count
+
+        # A station's order also waits for the handlers' trips to the other stations
+        rng = np.random.default_rng(0)
+        travel_time_samples = [sample_travel_times(num_handlers, rng) for _ in range(1000)]
+        mean_travel_times = {
+            station: np.mean([travel_times[station] for travel_times in travel_time_samples])
+            for station in component_assignments
+        }
+        self.lead_times = {
+            component: mean_travel_times[station] + (sum(mean_travel_times.values()) - mean_travel_times[station])/num_handlers
+            for station, component in component_assignments.items()
+        }
+
+        # Price one repair of each component, and the handlers, the same way as the simulation
+        unit_costs = add_day_costs({
+            **{f'{component}_repairs': 1 for component in ProductionDataset.components},
+            'num_handlers': num_handlers,
+        }, minutes_available)
+        self.repair_costs = {component: unit_costs[f'{component}_repair_costs'] for component in ProductionDataset.components}
+        self.prior_weights = np.array([self.day_count*unit_costs['MH_costs']] + [1.0]*len(ProductionDataset.components))
+        self.weights = self.prior_weights.copy()
+
+        self.features = []
+        self.total_costs = []
+        self.predictions = []
+
+    def expected_repairs(self, cvariant, allocation, reorder_point):
+        """Estimate the daily repairs of one variant."""
+        daily_demand = self.daily_demand.get(cvariant, 0)
+        if reorder_point is None:
+            return max(0, daily_demand - allocation)
+
+        # Demand during a delivery is Poisson, and the cycle length is at least one delivery's worth of demand
+        lead_time_demand = daily_demand*self.lead_times[cvariant[:2]]/self.minutes_available
+        probability = math.exp(-lead_time_demand)
+        expected_shortfall = lead_time_demand - reorder_point
+        for demand in range(reorder_point + 1):
+            expected_shortfall += (reorder_point - demand)*probability
+            probability *= lead_time_demand/(demand + 1)
+        order_size = max(allocation - reorder_point, lead_time_demand, 1)
+        return daily_demand/order_size*expected_shortfall
+
+    def policy_features(self, inventory_allocations, reorder_points):
+        """Return the analytic repair cost of every component over the horizon, after a constant."""
+        component_costs = dict.fromkeys(ProductionDataset.components, 0)
+        for cvariant, allocation in inventory_allocations.items():
+            component_costs[cvariant[:2]] += self.expected_repairs(cvariant, allocation, reorder_points.get(cvariant))
+        return np.array([1.0] + [
+            self.day_count*self.repair_costs[component]*component_costs[component]
+            for component in ProductionDataset.components
+        ])
+
+    def predict(self, inventory_allocations, reorder_points):
+        """Predict the total cost of a policy."""
+        return float(self.policy_features(inventory_allocations, reorder_points) @ self.weights)
+
+    def update(self, inventory_allocations, reorder_points, total_cost):
+        """Record a simulated cost and refit the weights, shrunk towards the analytic ones."""
+        features = self.policy_features(inventory_allocations, reorder_points)
+        self.predictions.append(float(features @ self.weights))
+        self.features.append(features)
+        self.total_costs.append(total_cost)
+
+        features = np.array(self.features)
+        penalty = self.ridge*np.diag((features**2).mean(axis=0) + 1e-9)
+        self.weights = np.linalg.solve(
+            features.T @ features + penalty,
+            features.T @ np.array(self.total_costs) + penalty @ self.prior_weights,
+        )
+
+    def rank_correlation(self):
+        """Return the Spearman correlation between the predictions and the simulated costs."""
+        import pandas as pd
+        predictions = pd.Series(self.predictions).rank()
+        total_costs = pd.Series(self.total_costs).rank()
+        return predictions.corr(total_costs)
+
+# The following section defines a parallel simulated annealing search. Several annealing chains
+# start from the same solution and run in a pool of worker processes. Each chain accepts a worse
+# neighbor with probability exp(-increase/temperature) and cools its temperature geometrically after
+# every move. The neighbors come from a NeighborGenerator per chain, so they are always valid and
+# favour the moves the chain accepted before; a tabu list is only kept when `tabu_size` is set.
+# Drawing the acceptance threshold before the simulation turns it into a cost bound, so rejected
+# neighbors usually stop after a few days. Every `exchange_interval` moves the chains
+# return to the main process, and the chain in the worst state restarts from the best solution found
+# so far. The search stops when the chains have used their iterations, the evaluation budget or the
+# time limit.
+
+_worker_caches = {}
+
+def _worker_cache(path):
+    """Keep one evaluation cache per worker process."""
+    if path not in _worker_caches:
+        _worker_caches[path] = EvaluationCache(path=path)
+    return _worker_caches[path]
+
+def _anneal_chain(
+    chain,
+    iterations,
+    deadline,
+    production_data,
+    dataset_path,
+    component_assignments,
+    space_available,
+    num_handlers,
+    cooling_rate,
+    seed,
+    engine,
+    cache_path,
+):
+    """Advance one annealing chain by up to iterations moves and return its new state."""
+    if production_data is None:
+        production_data = _load_worker_dataset(dataset_path)
+    cache = _worker_cache(cache_path)
+    station_cache = StationCache()
+    rng = random.Random()
+    rng.setstate(chain['random_state'])
+
+    for _ in range(iterations):
+        if deadline is not None and time.time() >= deadline:
+            break
+
+        neighbor = chain['neighbor_generator'].propose(chain['inventory_allocations'], chain['reorder_points'], rng=rng)
+        if neighbor is None:
+            break
+        move, new_inventory_allocations, new_reorder_points = neighbor
+        # Accept when the new cost is below this threshold, which is the Metropolis criterion
+        acceptance_threshold = chain['total_cost'] - chain['temperature']*math.log(1 - rng.random())
+        chain['temperature'] *= cooling_rate
+        chain['evaluations'] += 1
+
+        new_simulation_metrics = run_simulation(
+            production_data=production_data,
+            component_assignments=component_assignments,
+            inventory_allocations=new_inventory_allocations,
+            reorder_points=new_reorder_points,
+            num_handlers=num_handlers,
+            day_start=1,
+            day_end=90,
+            space_available=space_available,
+            engine=engine,
+            seed=seed,
+            cache=cache,
+            cost_bound=acceptance_threshold,
+            progress=False,
+            station_cache=station_cache,
+        )
+        new_total_cost = compute_total_cost(new_simulation_metrics)
+        accepted = not new_simulation_metrics.terminated_early and new_total_cost < acceptance_threshold
+        chain['neighbor_generator'].record(move, new_inventory_allocations, new_reorder_points, accepted)
+        if not accepted:
+            continue
+
+        chain['inventory_allocations'] = new_inventory_allocations
+        chain['reorder_points'] = new_reorder_points
+        chain['total_cost'] = new_total_cost
+        if new_total_cost < chain['best_total_cost']:
+            chain['best_inventory_allocations'] = new_inventory_allocations
+            chain['best_reorder_points'] = new_reorder_points
+            chain['best_total_cost'] = new_total_cost
+
+    chain['random_state'] = rng.getstate()
+    return chain
+
+def anneal_inventory(
+    inventory_allocations,
+    reorder_points,
+    data,
+    component_assignments,
+    space_available,
+    num_handlers=1,
+    chains=4,
+    workers=None,
+    max_iterations=5000,
+    max_evaluations=None,
+    time_limit=None,
+    initial_temperature=100,
+    cooling_rate=0.999,
+    exchange_interval=50,
+    seed=0,
+    engine='fast',
+    cache_path=None,
+    tabu_size=0,
+    verbose=True,
+):
+    """Search inventory allocations with parallel annealing chains and return the best one and a convergence trace."""
+    if not isinstance(data, ProductionDataset):
+        data = ProductionDataset(data)
+    if workers is None:
+        workers = min(chains, os.cpu_count())
+    start_time = time.time()
+    deadline = None if time_limit is None else start_time + time_limit
+
+    initial_simulation_metrics = run_simulation(
+        production_data=data,
+        component_assignments=component_assignments,
+        inventory_allocations=inventory_allocations,
+        reorder_points=reorder_points,
+        num_handlers=num_handlers,
+        day_start=1,
+        day_end=90,
+        space_available=space_available,
+        engine=engine,
+        seed=seed,
+        progress=False,
+    )
+    initial_total_cost = compute_total_cost(initial_simulation_metrics)
+
+    chain_states = [
+        {
+            'chain': chain,
+            'inventory_allocations': dict(inventory_allocations),
+            'reorder_points': dict(reorder_points),
+            'total_cost': initial_total_cost,
+            'best_inventory_allocations': dict(inventory_allocations),
+            'best_reorder_points': dict(reorder_points),
+            'best_total_cost': initial_total_cost,
+            'temperature': initial_temperature,
+            'evaluations': 0,
+            'random_state': random.Random(f'{seed}-{chain}').getstate(),
+            'neighbor_generator': NeighborGenerator(inventory_allocations, tabu_size=tabu_size),
+        }
+        for chain in range(chains)
+    ]
+    best_inventory_allocations = dict(inventory_allocations)
+    best_reorder_points = dict(reorder_points)
+    best_total_cost = initial_total_cost
+    trace = [{
+        'round': 0,
+        'evaluations': 0,
+        'elapsed': time.time() - start_time,
+        'best_total_cost': best_total_cost,
+        'temperature': initial_temperature,
+    }]
+
+    advance_chain = partial(
+        _anneal_chain,
+        production_data=data if data.path is None else None,
+        dataset_path=data.path,
+        component_assignments=component_assignments,
+        space_available=space_available,
+        num_handlers=num_handlers,
+        cooling_rate=cooling_rate,
+        seed=seed,
+        engine=engine,
+        cache_path=cache_path,
+    )
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        iteration = 0
+        while iteration < max_iterations:
+            evaluations = sum(chain['evaluations'] for chain in chain_states)
+            if deadline is not None and time.time() >= deadline:
+                break
+            if max_evaluations is not None and evaluations >= max_evaluations:
+                break
+
+            iterations = min(exchange_interval, max_iterations - iteration)
+            if max_evaluations is not None:
+                iterations = min(iterations, math.ceil((max_evaluations - evaluations)/chains))
+            step = partial(advance_chain, iterations=iterations, deadline=deadline)
+            if executor is None:
+                chain_states = [step(chain) for chain in chain_states]
+            else:
+                chain_states = list(executor.map(step, chain_states))
+            iteration += iterations
+
+            # Keep the best solution and send the chain in the worst state to it
+            best_chain = min(chain_states, key=lambda chain: chain['best_total_cost'])
+            if best_chain['best_total_cost'] < best_total_cost:
+                best_inventory_allocations = best_chain['best_inventory_allocations']
+                best_reorder_points = best_chain['best_reorder_points']
+                best_total_cost = best_chain['best_total_cost']
+                if verbose:
+                    print(f"Iteration {iteration}: Improved cost to {best_total_cost}")
+            worst_chain = max(chain_states, key=lambda chain: chain['total_cost'])
+            if worst_chain['total_cost'] > best_total_cost:
+                worst_chain['inventory_allocations'] = dict(best_inventory_allocations)
+                worst_chain['reorder_points'] = dict(best_reorder_points)
+                worst_chain['total_cost'] = best_total_cost
+
+            trace.append({
+                'round': len(trace),
+                'evaluations': sum(chain['evaluations'] for chain in chain_states),
+                'elapsed': time.time() - start_time,
+                'best_total_cost': best_total_cost,
+                'temperature': chain_states[0]['temperature'],
+            })
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return best_inventory_allocations, best_reorder_points, best_total_cost, trace
+
+# The following section defines an exhaustive search over the 120 ways to assign the five components
+# to the five stations. The assignment matters because the handler travel time differs between
+# stations. Every assignment is first simulated with the starting inventory policy, and the policies
+# are then tuned with simulated annealing in the order of those starting costs, spread over a pool
+# of worker processes. Once `min_tuned` assignments have been tuned, the cost of an assignment's
+# starting policy minus the largest improvement tuning has achieved so far, times `prune_margin`, is
+# used to estimate what tuning could reach. This is a heuristic, not a bound: assignments whose
+# estimate exceeds the best tuned cost are pruned without being tuned, and a small evaluation budget
+# makes the estimate optimistic about the best assignment, so `min_tuned` should then be raised.
+
+def _evaluate_assignment_task(component_assignments, production_data, dataset_path, **simulation_kwargs):
+    """Simulate the starting policy under one station assignment in a pool worker."""
+    if production_data is None:
+        production_data = _load_worker_dataset(dataset_path)
+    simulation_metrics = run_simulation(
+        production_data=production_data,
+        component_assignments=component_assignments,
+        progress=False,
+        **simulation_kwargs,
+    )
+    return compute_total_cost(simulation_metrics)
+
+def _tune_assignment_task(component_assignments, production_data, dataset_path, **annealing_kwargs):
+    """Tune the inventory policy of one station assignment in a pool worker."""
+    if production_data is None:
+        production_data = _load_worker_dataset(dataset_path)
+    return anneal_inventory(
+        data=production_data,
+        component_assignments=component_assignments,
+        chains=1,
+        workers=1,
+        verbose=False,
+        **annealing_kwargs,
+    )
+
+def search_station_assignments(
+    inventory_allocations,
+    reorder_points,
+    data,
+    space_available,
+    num_handlers=1,
+    evaluations_per_assignment=200,
+    workers=None,
+    prune_margin=1.5,
+    min_tuned=10,
+    seed=0,
+    engine='fast',
+    verbose=True,
+):
+    """Tune the inventory policy of every station assignment that may beat the best one found.
+
+    Returns the best assignment, its allocations, reorder points and cost, and a list with the outcome of every assignment."""
+    if not isinstance(data, ProductionDataset):
+        data = ProductionDataset(data)
+    if workers is None:
+        workers = os.cpu_count()
+
+    assignments = [
+        {f'Station {idx}': component for idx, component in enumerate(components, 1)}
+        for components in itertools.permutations(ProductionDataset.components)
+    ]
+    shared_data = {
+        'production_data': data if data.path is None else None,
+        'dataset_path': data.path,
+    }
+    simulation_kwargs = {
+        'inventory_allocations': inventory_allocations,
+        'reorder_points': reorder_points,
+        'num_handlers': num_handlers,
+        'space_available': space_available,
+        'seed': seed,
+        'engine': engine,
+    }
+    annealing_kwargs = {
+        'inventory_allocations': inventory_allocations,
+        'reorder_points': reorder_points,
+        'space_available': space_available,
+        'num_handlers': num_handlers,
+        'max_evaluations': evaluations_per_assignment,
+        'seed': seed,
+        'engine': engine,
+    }
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        initial_costs = list(_progress_bar(
+            executor.map(partial(_evaluate_assignment_task, **shared_data, **simulation_kwargs), assignments),
+            'Simulating assignments',
+            total=len(assignments),
+            disable=not verbose,
+        ))
+        results = [
+            {
+                'component_assignments': component_assignments,
+                'initial_total_cost': initial_total_cost,
+                'total_cost': None,
+                'pruned': False,
+            }
+            for component_assignments, initial_total_cost in zip(assignments, initial_costs)
+        ]
+        pending = sorted(results, key=lambda result: result['initial_total_cost'])
+
+        best_result = None
+        best_improvement = 0
+        tuned = 0
+        running = {}
+        progress_bar = _progress_bar(None, 'Tuning assignments', total=len(results), disable=not verbose)
+        while pending or running:
+            while pending and len(running) < workers:
+                result = pending.pop(0)
+                prune_estimate = result['initial_total_cost'] - prune_margin*best_improvement
+                if best_result is not None and tuned >= min_tuned and prune_estimate > best_result['total_cost']:
+                    result['pruned'] = True
+                    progress_bar.update()
+                    continue
+                future = executor.submit(
+                    _tune_assignment_task,
+                    result['component_assignments'],
+                    **shared_data,
+                    **annealing_kwargs,
+                )
+                running[future] = result
+
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = running.pop(future)
+                (
+                    result['inventory_allocations'],
+                    result['reorder_points'],
+                    result['total_cost'],
+                    _,
+                ) = future.result()
+                tuned += 1
+                best_improvement = max(best_improvement, result['initial_total_cost'] - result['total_cost'])
+                if best_result is None or result['total_cost'] < best_result['total_cost']:
+                    best_result = result
+                    if verbose:
+                        print(f"Assignment {list(result['component_assignments'].values())}: Improved cost to {result['total_cost']}")
+                progress_bar.update()
+        progress_bar.close()
+
+    return (
+        best_result['component_assignments'],
+        best_result['inventory_allocations'],
+        best_result['reorder_points'],
+        best_result['total_cost'],
+        results,
+    )
+
+# The following section defines a sweep over the station capacity, to find the smallest
+# `space_available` that still reaches a target cost. Capacities are walked down a descending grid
+# in waves of one level per worker process. Every level in a wave starts its annealing search from
+# the best solution of the smallest capacity solved so far, scaled down to its own capacity, instead
+# of from scratch. The sweep stops after a wave in which no level reaches the target, and returns
+# the cost-vs-capacity frontier as a table. Capacities too small to hold one unit of every variant
+# of a component are not tuned, and are marked as skipped in the frontier if the sweep reaches them.
+
+def scale_policy(inventory_allocations, reorder_points, space_available):
+    """Scale the allocations of every component to fill `space_available` units, keeping at least one unit per variant."""
+    scaled_allocations = {}
+    scaled_reorder_points = {}
+    for component in ProductionDataset.components:
+        variants = [variant for variant in inventory_allocations if variant.startswith(component)]
+        assert space_available >= len(variants), f'{space_available} units cannot hold one unit of each of the {len(variants)} variants of component {component}'
+        total_allocation = sum(inventory_allocations[variant] for variant in variants)
+        shares = {variant: inventory_allocations[variant]*space_available/total_allocation for variant in variants}
+        allocations = {variant: max(1, math.floor(share)) for variant, share in shares.items()}
+
+        # Hand out the remaining units by largest remainder, or take back the units added by the lower limit
+        by_remainder = sorted(variants, key=lambda variant: shares[variant] - math.floor(shares[variant]), reverse=True)
+        for variant in by_remainder[:max(0, space_available - sum(allocations.values()))]:
+            allocations[variant] += 1
+        while sum(allocations.values()) > space_available:
+            allocations[max(allocations, key=allocations.get)] -= 1
+
+        for variant in variants:
+            scaled_allocations[variant] = allocations[variant]
+            scaled_reorder_points[variant] = min(
+                allocations[variant] - 1,
+                round(reorder_points[variant]*allocations[variant]/inventory_allocations[variant]),
+            )
+    return scaled_allocations, scaled_reorder_points
+
+def _tune_capacity_task(level, production_data, dataset_path, **annealing_kwargs):
+    """Tune a scaled inventory policy for one station capacity in a pool worker."""
+    if production_data is None:
+        production_data = _load_worker_dataset(dataset_path)
+    space_available, inventory_allocations, reorder_points = level
+    return anneal_inventory(
+        inventory_allocations=inventory_allocations,
+        reorder_points=reorder_points,
+        data=production_data,
+        space_available=space_available,
+        chains=1,
+        workers=1,
+        verbose=False,
+        **annealing_kwargs,
+    )
+
+def sweep_capacity(
+    inventory_allocations,
+    reorder_points,
+    data,
+    component_assignments,
+    target_cost,
+    capacities=range(140, 9, -10),
+    num_handlers=1,
+    evaluations_per_level=200,
+    workers=None,
+    seed=0,
+    engine='fast',
+    verbose=True,
+):
+    """Find the smallest capacity reaching `target_cost` and return its solution and the cost-vs-capacity frontier."""
+    if not isinstance(data, ProductionDataset):
+        data = ProductionDataset(data)
+    if workers is None:
+        workers = os.cpu_count()
+
+    capacities = sorted(capacities, reverse=True)
+    variant_counts = [
+        sum(variant.startswith(component) for variant in inventory_allocations)
+        for component in ProductionDataset.components
+    ]
+    skipped_capacities = [space_available for space_available in capacities if space_available < max(variant_counts)]
+    capacities = [space_available for space_available in capacities if space_available >= max(variant_counts)]
+    shared_data = {
+        'production_data': data if data.path is None else None,
+        'dataset_path': data.path,
+    }
+    annealing_kwargs = {
+        'component_assignments': component_assignments,
+        'num_handlers': num_handlers,
+        'max_evaluations': evaluations_per_level,
+        'seed': seed,
+        'engine': engine,
+    }
+
+    frontier = []
+    best_level = None
+    warm_allocations, warm_reorder_points = inventory_allocations, reorder_points
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for wave_start in _progress_bar(range(0, len(capacities), workers), 'Sweeping capacities', disable=not verbose):
+            wave = [
+                (space_available, *scale_policy(warm_allocations, warm_reorder_points, space_available))
+                for space_available in capacities[wave_start:wave_start + workers]
+            ]
+            wave_results = executor.map(partial(_tune_capacity_task, **shared_data, **annealing_kwargs), wave)
+
+            reached_target = False
+            for (space_available, _, _), (best_allocations, best_reorder_points, best_total_cost, _) in zip(wave, wave_results):
+                frontier.append({
+                    'space_available': space_available,
+                    'total_cost': best_total_cost,
+                    'reached_target': best_total_cost <= target_cost,
+                    'skipped': False,
+                })
+                if best_total_cost <= target_cost:
+                    reached_target = True
+                    best_level = (space_available, best_allocations, best_reorder_points, best_total_cost)
+                    if verbose:
+                        print(f"Capacity {space_available}: Reached cost {best_total_cost}")
+                warm_allocations, warm_reorder_points = best_allocations, best_reorder_points
+            if not reached_target:
+                break
+        else:
+            frontier.extend(
+                {'space_available': space_available, 'total_cost': None, 'reached_target': False, 'skipped': True}
+                for space_available in skipped_capacities
+            )
+
+    import pandas as pd
+    frontier = pd.DataFrame(frontier)
+    if best_level is None:
+        return None, None, None, None, frontier
+    return (*best_level, frontier)
+
+# The following section defines a benchmark of the simulation and the optimization, to tell whether
+# a change made them faster or slower. The fixtures are the production data and the hard-coded
+# solutions for capacity 100 and 140. Each solution is run for horizons of 1, 10 and 90 days. For
+# each run the benchmark measures days per second with the SimPy and fast engines, SimPy events per
+# second, peak memory and optimizer evaluations per second. The events are counted in a separate
+# instrumented run, and peak memory is measured with tracemalloc in another run, so neither slows
+# down the timed run. Every run also records its total cost at the fixed seed, and the time a fresh
+# interpreter takes to import this module is measured once. Compared with a stored baseline, a
+# changed cost fails and a drop in throughput beyond `tolerance` is reported. The results include
+# the benchmarked solutions, so benchmark.py can rerun a stored baseline without the notebook.
+
+def benchmark_solution(
+    production_data,
+    component_assignments,
+    inventory_allocations,
+    reorder_points,
+    space_available,
+    days,
+    num_handlers=1,
+    seed=0,
+    optimizer_iterations=20,
+):
+    """Measure the throughput of simulating and optimizing one solution over the first `days` days."""
+    simulation_kwargs = {
+        'production_data': production_data,
+        'component_assignments': component_assignments,
+        'inventory_allocations': inventory_allocations,
+        'reorder_points': reorder_points,
+        'num_handlers': num_handlers,
+        'day_start': 1,
+        'day_end': days,
+        'space_available': space_available,
+        'seed': seed,
+        'progress': False,
+    }
+
+    started_at = time.perf_counter()
+    simulation_metrics = run_simulation(engine='simpy', **simulation_kwargs)
+    simpy_time = time.perf_counter() - started_at
+
+    started_at = time.perf_counter()
+    fast_total_cost = compute_total_cost(run_simulation(engine='fast', **simulation_kwargs))
+    fast_time = time.perf_counter() - started_at
+
+    simulation_trace = SimulationTrace()
+    run_simulation(engine='simpy', trace=simulation_trace, **simulation_kwargs)
+    events = simulation_trace.to_polars()['events'].sum()
+
+    tracemalloc.start()
+    run_simulation(engine='simpy', **simulation_kwargs)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    started_at = time.perf_counter()
+    optimize_inventory(
+        inventory_allocations,
+        reorder_points,
+        data=production_data,
+        component_assignments=component_assignments,
+        space_available=space_available,
+        num_handlers=num_handlers,
+        max_iterations=optimizer_iterations,
+        seed=seed,
+        day_end=days,
+        verbose=False,
+    )
+    optimizer_time = time.perf_counter() - started_at
+
+    total_cost = compute_total_cost(simulation_metrics)
+    assert fast_total_cost == total_cost, f'The fast engine costs {fast_total_cost} instead of {total_cost}'
+    return {
+        'capacity': space_available,
+        'days': days,
+        'total_cost': float(total_cost),
+        'simpy_days_per_second': days/simpy_time,
+        'fast_days_per_second': days/fast_time,
+        'simpy_events_per_second': float(events)/simpy_time,
+        'peak_memory_mb': peak_memory/2**20,
+        'optimizer_evaluations_per_second': (optimizer_iterations + 1)/optimizer_time,
+    }
+
+def measure_import_time(module='algo', repeat=5):
+    """Return the shortest time a fresh interpreter takes to import a module, as a new worker process would."""
+    import_times = []
+    for _ in range(repeat):
+        completed = subprocess.run(
+            [sys.executable, '-c', f'import time; started_at = time.perf_counter(); import {module}; print(time.perf_counter() - started_at)'],
+            capture_output=True,
+            check=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        import_times.append(float(completed.stdout))
+    return min(import_times)
+
+def run_benchmarks(production_data, solutions, horizons=(1, 10, 90), seed=0, optimizer_iterations=20):
+    """Benchmark every solution, given as {capacity: (component_assignments, inventory_allocations, reorder_points)}, over every horizon."""
+    if not isinstance(production_data, ProductionDataset):
+        production_data = ProductionDataset(production_data)
+
+    # An untimed run imports SimPy and warms up the engines, so the first case is not slowed down by them
+    space_available, (component_assignments, inventory_allocations, reorder_points) = next(iter(solutions.items()))
+    benchmark_solution(production_data, component_assignments, inventory_allocations, reorder_points, space_available, 1, seed=seed)
+
+    cases = {}
+    for space_available, (component_assignments, inventory_allocations, reorder_points) in solutions.items():
+        for days in horizons:
+            cases[f'{space_available}/{days}'] = benchmark_solution(
+                production_data,
+                component_assignments,
+                inventory_allocations,
+                reorder_points,
+                space_available,
+                days,
+                seed=seed,
+                optimizer_iterations=optimizer_iterations,
+            )
+    return {
+        'seed': seed,
+        'optimizer_iterations': optimizer_iterations,
+        'import_seconds': measure_import_time(),
+        'solutions': {
+            space_available: {
+                'component_assignments': component_assignments,
+                'inventory_allocations': inventory_allocations,
+                'reorder_points': reorder_points,
+            }
+            for space_available, (component_assignments, inventory_allocations, reorder_points) in solutions.items()
+        },
+        'cases': cases,
+    }
+
+def compare_benchmarks(results, baseline, tolerance=0.2):
+    """Assert that the total costs match the baseline and return the measurements that regressed by more than `tolerance`."""
+    regressions = []
+    if 'import_seconds' in baseline and results['import_seconds'] > (1 + tolerance)*baseline['import_seconds']:
+        regressions.append(f"import_seconds: {results['import_seconds']:.3f} against {baseline['import_seconds']:.3f}")
+    for case, measurements in results['cases'].items():
+        if case not in baseline['cases']:
+            continue
+        baseline_measurements = baseline['cases'][case]
+        assert measurements['total_cost'] == baseline_measurements['total_cost'], (
+            f"Case {case} costs {measurements['total_cost']} instead of {baseline_measurements['total_cost']}"
+        )
+        for metric, value in measurements.items():
+            if metric.endswith('_per_second') and value < (1 - tolerance)*baseline_measurements[metric]:
+                regressions.append(f'{case} {metric}: {value:.1f} against {baseline_measurements[metric]:.1f}')
+            if metric == 'peak_memory_mb' and value > (1 + tolerance)*baseline_measurements[metric]:
+                regressions.append(f'{case} {metric}: {value:.1f} against {baseline_measurements[metric]:.1f}')
+    return regressions
+
+# The following section defines a local evaluation service for policies submitted by other
+# programs. An `EvaluationServer` keeps the memory-mapped production data, the evaluation cache and
+# a pool of worker processes alive between requests. Requests are JSON lines holding the
+# `component_assignments`, `inventory_allocations` and `reorder_points` of a candidate, an optional
+# `id`, and optionally any of `num_handlers`, `space_available`, `day_start`, `day_end` and `seed`,
+# which otherwise take the server's defaults. They are read in batches from a JSONL file, which can
+# be followed as a queue, or from a Unix socket. Candidates that are already cached are answered at
+# once, and a candidate that is already being simulated is only simulated once. The others are
+# spread over the workers in chunks. Every result is written as a JSON line as soon as its chunk
+# finishes, so results do not come back in request order and are matched by `id`.
+
+def _evaluate_candidates_task(candidates, production_data, dataset_path, engine):
+    """Simulate a chunk of candidates in a pool worker and return their daily metrics, or the error of each failed one."""
+    if production_data is None:
+        production_data = _load_worker_dataset(dataset_path)
+    all_daily_metrics = []
+    station_cache = StationCache()
+    for candidate in candidates:
+        try:
+            simulation_metrics = run_simulation(
+                production_data=production_data,
+                engine=engine,
+                progress=False,
+                station_cache=station_cache,
+                **candidate,
+            )
+        except Exception as error:
+            all_daily_metrics.append(f'{type(error).__name__}: {error}')
+            continue
+        all_daily_metrics.append(list(simulation_metrics))
+    return all_daily_metrics
+
+def _jsonl_batches(requests_file, batch_size, follow=False, poll_interval=0.5):
+    """Yield the lines of a JSONL file in batches, and empty batches while waiting for a followed file to grow."""
+    buffered = ''
+    while True:
+        lines = []
+        while len(lines) < batch_size:
+            line = requests_file.readline()
+            if not line:
+                break
+            # A followed file can end in a line that is still being written
+            buffered += line
+            if buffered.endswith('\n'):
+                lines.append(buffered)
+                buffered = ''
+        if lines:
+            yield lines
+        elif follow:
+            time.sleep(poll_interval)
+            yield []
+        else:
+            if buffered:
+                yield [buffered]
+            return
+
+def _socket_batches(connection, batch_size, poll_interval=0.5):
+    """Yield the lines received on a connection in batches, and empty batches while none arrive."""
+    connection.settimeout(poll_interval)
+    buffered = b''
+    while True:
+        try:
+            data = connection.recv(1 << 16)
+        except TimeoutError:
+            yield []
+            continue
+        if not data:
+            if buffered.strip():
+                yield [buffered.decode()]
+            return
+        *lines, buffered = (buffered + data).split(b'\n')
+        for start in range(0, len(lines), batch_size):
+            yield [line.decode() for line in lines[start:start + batch_size]]
+
+class EvaluationServer:
+    defaults = {'num_handlers': 1, 'space_available': 100, 'day_start': 1, 'day_end': 90, 'seed': 0}
+
+    def __init__(self, production_data, workers=None, batch_size=256, engine='fast', cache_path=None, **defaults):
+        if not isinstance(production_data, ProductionDataset):
+            production_data = ProductionDataset(production_data)
+        self.production_data = production_data
+        self.days = set(production_data.days.tolist())
+        self.workers = os.cpu_count() if workers is None else workers
+        self.batch_size = batch_size
+        self.engine = engine
+        self.defaults = {**self.defaults, **defaults}
+        self.cache = EvaluationCache(path=cache_path)
+        self.evaluations = 0
+        self.duplicates = 0
+
+        # Map the dataset in every worker before the first request arrives
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        if production_data.path is not None:
+            list(self.executor.map(_load_worker_dataset, [production_data.path]*self.workers))
+
+    def close(self):
+        self.executor.shutdown()
+        if self.cache.connection is not None:
+            self.cache.connection.close()
+
+    def validate_request(self, candidate):
+        """Check the settings of a candidate before it reaches the workers."""
+        for name in self.defaults:
+            value = candidate[name]
+            assert isinstance(value, int) and not isinstance(value, bool) and value >= 0, f'{name} must be a nonnegative integer'
+        assert candidate['num_handlers'] >= 1, 'You need at least one handler'
+        assert candidate['day_start'] <= candidate['day_end'], 'day_start must not be after day_end'
+        assert candidate['day_end'] <= max(self.days), f'The production data ends on day {max(self.days)}'
+        missing_days = set(range(candidate['day_start'], candidate['day_end'] + 1)) - self.days
+        assert not missing_days, f'The production data has no day {min(missing_days)}'
+        validate_policy(
+            candidate['component_assignments'],
+            candidate['inventory_allocations'],
+            candidate['reorder_points'],
+            candidate['space_available'],
+        )
+
+    def result(self, request_id, key, simulation_metrics, cached):
+        """Summarize the costs of an evaluated candidate."""
+        result = {'id': request_id, 'key': key, 'cached': cached}
+        for column, values in simulation_metrics.columns().items():
+            if column.endswith('costs'):
+                result[column] = values.sum().item()
+        return result
+
+    def serve(self, batches, write):
+        """Evaluate every request in the batches and pass each result to write as soon as it is known."""
+        shared_data = {
+            'production_data': self.production_data if self.production_data.path is None else None,
+            'dataset_path': self.production_data.path,
+            'engine': self.engine,
+        }
+        waiting = {}
+        running = {}
+
+        def write_finished(done):
+            for future in done:
+                keys = running.pop(future)
+                try:
+                    all_daily_metrics = future.result()
+                except Exception as error:
+                    # A failed chunk, such as one whose worker died, only fails its own requests
+                    all_daily_metrics = [f'{type(error).__name__}: {error}']*len(keys)
+                for key, daily_metrics in zip(keys, all_daily_metrics):
+                    if isinstance(daily_metrics, str):
+                        for request_id in waiting.pop(key):
+                            write({'id': request_id, 'key': key, 'error': daily_metrics})
+                        continue
+                    simulation_metrics = SimulationMetrics(daily_metrics)
+                    self.cache.put(key, simulation_metrics)
+                    for request_id in waiting.pop(key):
+                        write(self.result(request_id, key, simulation_metrics, cached=False))
+
+        for lines in batches:
+            candidates = {}
+            for line in lines:
+                if not line.strip():
+                    continue
+                request_id = None
+                try:
+                    request = json.loads(line)
+                    request_id = request.get('id')
+                    candidate = {
+                        'component_assignments': request['component_assignments'],
+                        'inventory_allocations': request['inventory_allocations'],
+                        'reorder_points': request['reorder_points'],
+                        **{name: request.get(name, value) for name, value in self.defaults.items()},
+                    }
+                    self.validate_request(candidate)
+                    key = candidate_key(self.production_data, **candidate)
+                except (ValueError, KeyError, TypeError, AttributeError, AssertionError) as error:
+                    write({'id': request_id, 'error': f'{type(error).__name__}: {error}'})
+                    continue
+
+                if key in waiting:
+                    waiting[key].append(request_id)
+                    self.duplicates += 1
+                    continue
+                cached_metrics = self.cache.get(key)
+                if cached_metrics is not None:
+                    write(self.result(request_id, key, cached_metrics, cached=True))
+                    continue
+                waiting[key] = [request_id]
+                candidates[key] = candidate
+
+            candidates = list(candidates.items())
+            chunk_size = max(1, len(candidates)//(4*self.workers))
+            for start in range(0, len(candidates), chunk_size):
+                chunk = candidates[start:start + chunk_size]
+                future = self.executor.submit(_evaluate_candidates_task, [candidate for _, candidate in chunk], **shared_data)
+                running[future] = [key for key, _ in chunk]
+                self.evaluations += len(chunk)
+
+            # Stream the finished chunks, and stop reading requests while the workers are busy
+            write_finished([future for future in running if future.done()])
+            while len(running) > 4*self.workers:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                write_finished(done)
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            write_finished(done)
+
+    def serve_jsonl(self, requests_path, results_path=None, follow=False, poll_interval=0.5):
+        """Evaluate the requests in a JSONL file and append the results to another, or print them.
+
+        With `follow` the requests file is treated as a queue and read until the server is interrupted."""
+        results_file = sys.stdout if results_path is None else open(results_path, 'a')
+        try:
+            def write(result):
+                results_file.write(json.dumps(result) + '\n')
+                results_file.flush()
+
+            with open(requests_path) as requests_file:
+                self.serve(_jsonl_batches(requests_file, self.batch_size, follow, poll_interval), write)
+        finally:
+            if results_file is not sys.stdout:
+                results_file.close()
+
+    def serve_socket(self, path, poll_interval=0.5):
+        """Listen on a Unix socket and answer the requests of each connection on that connection, one connection at a time."""
+        if os.path.exists(path):
+            os.remove(path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(path)
+        listener.listen()
+        try:
+            while True:
+                connection, _ = listener.accept()
+                with connection:
+                    def write(result):
+                        connection.sendall((json.dumps(result) + '\n').encode())
+
+                    try:
+                        self.serve(_socket_batches(connection, self.batch_size, poll_interval), write)
+                    except (BrokenPipeError, ConnectionResetError):
+                        continue
+        finally:
+            listener.close()
+            os.remove(path)
+
+def request_evaluations(path, requests):
+    """Send requests to an EvaluationServer listening on a Unix socket and yield its results as they arrive."""
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.connect(path)
+
+    def send_requests():
+        for request in requests:
+            connection.sendall((json.dumps(request) + '\n').encode())
+        connection.shutdown(socket.SHUT_WR)
+
+    # The server answers while it is still reading, so the requests are sent from another thread
+    sender = threading.Thread(target=send_requests, daemon=True)
+    sender.start()
+    with connection, connection.makefile() as results_file:
+        for line in results_file:
+            yield json.loads(line)
+    sender.join()
+
+def main(argv=None):
+    """Run an EvaluationServer from the command line."""
+    import argparse
+    parser = argparse.ArgumentParser(description='Evaluate inventory policies submitted as JSON lines.')
+    parser.add_argument('data', help='production data CSV file or URL')
+    parser.add_argument('--dataset-cache', default='production_data_cache', help='directory of the memory-mapped dataset')
+    requests_source = parser.add_mutually_exclusive_group(required=True)
+    requests_source.add_argument('--requests', help='JSONL file of requests')
+    requests_source.add_argument('--socket', help='Unix socket to listen on for requests')
+    parser.add_argument('--results', help='JSONL file the results are appended to, standard output by default')
+    parser.add_argument('--follow', action='store_true', help='keep reading the requests file as it grows')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--cache-path', help='SQLite file of cached evaluations')
+    parser.add_argument('--num-handlers', type=int, default=1)
+    parser.add_argument('--space-available', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    server = EvaluationServer(
+        load_production_dataset(args.data, args.dataset_cache),
+        workers=args.workers,
+        batch_size=args.batch_size,
+        cache_path=args.cache_path,
+        num_handlers=args.num_handlers,
+        space_available=args.space_available,
+        seed=args.seed,
+    )
+    try:
+        if args.socket is not None:
+            server.serve_socket(args.socket)
+        else:
+            server.serve_jsonl(args.requests, args.results, follow=args.follow)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == '__main__':
+    main()
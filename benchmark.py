@@ -0,0 +1,55 @@
+"""Rerun the benchmark stored in benchmark_baseline.json and report regressions, without the notebook.
+
+    python benchmark.py production_data.csv
+
+The solutions, horizons, seed and optimizer iterations are read from the baseline. With --update the
+results replace the baseline, which is needed after moving to another machine, since throughput depends
+on it. The exit status is 1 when something regressed.
+"""
+
+import argparse
+import json
+import sys
+
+from algo import compare_benchmarks, load_production_dataset, run_benchmarks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the simulation and the optimizer against a stored baseline.')
+    parser.add_argument('data', help='production data CSV file or URL')
+    parser.add_argument('--dataset-cache', default='production_data_cache', help='directory of the memory-mapped dataset')
+    parser.add_argument('--baseline', default='benchmark_baseline.json', help='baseline written by the notebook or by --update')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative change reported as a regression')
+    parser.add_argument('--update', action='store_true', help='store the results as the new baseline')
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    solutions = {
+        int(space_available): (
+            solution['component_assignments'],
+            solution['inventory_allocations'],
+            solution['reorder_points'],
+        )
+        for space_available, solution in baseline['solutions'].items()
+    }
+    horizons = sorted({case['days'] for case in baseline['cases'].values()})
+
+    results = run_benchmarks(
+        load_production_dataset(args.data, args.dataset_cache),
+        solutions,
+        horizons=horizons,
+        seed=baseline['seed'],
+        optimizer_iterations=baseline['optimizer_iterations'],
+    )
+    regressions = compare_benchmarks(results, baseline, tolerance=args.tolerance)
+    print('\n'.join(regressions) if regressions else 'No regressions against the baseline')
+
+    if args.update:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
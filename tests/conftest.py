@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPOSITORY)
+
+from algo import ProductionDataset
+
+
+@pytest.fixture(scope='session')
+def dataset():
+    return ProductionDataset.from_csv(os.path.join(REPOSITORY, 'production_data.csv'))
+
+
+@pytest.fixture
+def component_assignments():
+    return {
+        'Station 1': 'CA',
+        'Station 2': 'CC',
+        'Station 3': 'CE',
+        'Station 4': 'CB',
+        'Station 5': 'CD',
+    }
+
+
+@pytest.fixture
+def inventory_allocations():
+    return {
+        'CA1': 15, 'CA2': 13, 'CA3': 7, 'CA4': 14, 'CA5': 9, 'CA6': 16, 'CA7': 11, 'CA8': 15,
+        'CB1': 16, 'CB2': 57, 'CB3': 27,
+        'CC1': 5, 'CC2': 22, 'CC3': 10, 'CC4': 15, 'CC5': 12, 'CC6': 19, 'CC7': 17,
+        'CD1': 9, 'CD2': 17, 'CD3': 35, 'CD4': 2, 'CD5': 22, 'CD6': 15,
+        'CE1': 2, 'CE2': 7, 'CE3': 12, 'CE4': 5, 'CE5': 2, 'CE6': 18, 'CE7': 13, 'CE8': 18, 'CE9': 23,
+    }
+
+
+@pytest.fixture
+def reorder_points(inventory_allocations):
+    return {cvariant: allocation - 1 for cvariant, allocation in inventory_allocations.items()}
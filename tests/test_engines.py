@@ -0,0 +1,214 @@
+import json
+import os
+import random
+
+import polars as pl
+import pytest
+
+from algo import (
+    DeltaEvaluator,
+    EvaluationCache,
+    ProductionDataset,
+    SimulationMetrics,
+    StationCache,
+    compute_total_cost,
+    get_neighbor_solution,
+    run_replications,
+    run_simulation,
+    run_simulation_batch,
+    stream_simulation,
+    validate_policy,
+)
+
+
+def random_policies(inventory_allocations, count, seed):
+    """Draw policies with random reorder points around the given allocations."""
+    rng = random.Random(seed)
+    policies = []
+    while len(policies) < count:
+        allocations, reorder_points = get_neighbor_solution(
+            inventory_allocations,
+            {cvariant: allocation - 1 for cvariant, allocation in inventory_allocations.items()},
+            rng=rng,
+        )
+        reorder_points = {cvariant: rng.randrange(allocation) for cvariant, allocation in allocations.items()}
+        policies.append((allocations, reorder_points))
+    return policies
+
+
+@pytest.mark.parametrize('num_handlers', [1, 2, 5])
+def test_engines_match_simpy(num_handlers, dataset, component_assignments, inventory_allocations):
+    policies = random_policies(inventory_allocations, 3, seed=num_handlers)
+    engines = ['fast', 'stations'] if num_handlers >= len(component_assignments) else ['fast']
+    station_cache = StationCache()
+    for allocations, reorder_points in policies:
+        simulation_kwargs = {
+            'production_data': dataset,
+            'component_assignments': component_assignments,
+            'inventory_allocations': allocations,
+            'reorder_points': reorder_points,
+            'num_handlers': num_handlers,
+            'day_end': 3,
+            'progress': False,
+        }
+        expected = list(run_simulation(engine='simpy', **simulation_kwargs))
+        for engine in engines:
+            assert list(run_simulation(engine=engine, **simulation_kwargs)) == expected, engine
+        if 'stations' in engines:
+            for _ in range(2):
+                assert list(run_simulation(engine='stations', station_cache=station_cache, **simulation_kwargs)) == expected
+            assert station_cache.hits > 0
+
+    total_costs = run_simulation_batch(
+        dataset,
+        component_assignments,
+        policies,
+        num_handlers=num_handlers,
+        day_end=3,
+        progress=False,
+    )
+    for candidate_costs, (allocations, reorder_points) in zip(total_costs, policies):
+        expected = run_simulation(
+            dataset,
+            component_assignments,
+            allocations,
+            reorder_points,
+            num_handlers=num_handlers,
+            day_end=3,
+            engine='simpy',
+            progress=False,
+        )
+        assert candidate_costs.tolist() == expected['Total_costs'].tolist()
+
+
+@pytest.mark.parametrize('source', ['frame', 'memory_map'])
+def test_parallel_run_matches_serial_run(source, tmp_path, dataset, component_assignments, inventory_allocations, reorder_points):
+    if source == 'frame':
+        production_data = pl.read_csv(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'production_data.csv'))
+    else:
+        dataset.save(tmp_path / 'dataset')
+        production_data = ProductionDataset.load(tmp_path / 'dataset')
+    simulation_kwargs = {
+        'production_data': production_data,
+        'component_assignments': component_assignments,
+        'inventory_allocations': inventory_allocations,
+        'reorder_points': reorder_points,
+        'day_end': 12,
+        'engine': 'fast',
+        'progress': False,
+    }
+    expected = run_simulation(workers=1, **simulation_kwargs)
+    assert not expected.terminated_early
+    assert list(run_simulation(workers=2, **simulation_kwargs)) == list(expected)
+
+    # Stop once the running cost passes the cost of the first four days
+    cost_bound = float(expected['Total_costs'][:4].sum())
+    for workers in [1, 2]:
+        bounded = run_simulation(workers=workers, cost_bound=cost_bound, **simulation_kwargs)
+        assert bounded.terminated_early
+        assert len(bounded) == 5
+        assert list(bounded) == list(expected)[:5]
+
+
+def test_stream_simulation_matches_run_simulation_across_chunk_boundaries(tmp_path, dataset, component_assignments, inventory_allocations, reorder_points):
+    source = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'production_data.csv')
+    # About 600 vehicles are produced a day, so chunks of 250 rows split every day
+    streamed = list(stream_simulation(
+        source,
+        component_assignments,
+        inventory_allocations,
+        reorder_points,
+        day_start=2,
+        day_end=5,
+        chunk_size=250,
+    ))
+    expected = run_simulation(
+        dataset,
+        component_assignments,
+        inventory_allocations,
+        reorder_points,
+        day_start=2,
+        day_end=5,
+        engine='fast',
+        progress=False,
+    )
+    assert [run_metrics['day'] for run_metrics in streamed] == [2, 3, 4, 5]
+    assert streamed == list(expected)
+
+    shuffled_source = tmp_path / 'shuffled.csv'
+    production_data = pl.read_csv(source).filter(pl.col('day') <= 3)
+    pl.concat([production_data.filter(pl.col('day') != 2), production_data.filter(pl.col('day') == 2)]).write_csv(shuffled_source)
+    with pytest.raises(AssertionError, match='ordered by day'):
+        list(stream_simulation(shuffled_source, component_assignments, inventory_allocations, reorder_points, chunk_size=250))
+
+
+def test_replications_use_spawned_streams(dataset, component_assignments, inventory_allocations, reorder_points):
+    simulation_kwargs = {
+        'production_data': dataset,
+        'component_assignments': component_assignments,
+        'inventory_allocations': inventory_allocations,
+        'reorder_points': reorder_points,
+        'day_end': 5,
+    }
+    results = run_replications(replications=3, seed=7, **simulation_kwargs)
+    expected = [
+        compute_total_cost(run_simulation(engine=engine, seed=seed, progress=False, **simulation_kwargs))
+        for engine, seed in [('fast', 7), ('simpy', (7, 1)), ('fast', (7, 2))]
+    ]
+    assert results['total_costs'] == expected
+    # Replication 1 of seed 7 no longer shares its streams with the single run of seed 8
+    replication_metrics = run_simulation(engine='fast', seed=(7, 1), progress=False, **simulation_kwargs)
+    next_seed_metrics = run_simulation(engine='fast', seed=8, progress=False, **simulation_kwargs)
+    assert replication_metrics.counts.tolist() != next_seed_metrics.counts.tolist()
+
+
+@pytest.mark.parametrize('num_handlers', [1, 2])
+def test_delta_evaluator_matches_full_run(num_handlers, dataset, component_assignments, inventory_allocations, reorder_points):
+    evaluator = DeltaEvaluator(dataset, component_assignments, num_handlers=num_handlers, day_end=5)
+    evaluator.set_incumbent(inventory_allocations, reorder_points)
+    rng = random.Random(num_handlers)
+    for _ in range(20):
+        allocations, new_reorder_points = get_neighbor_solution(inventory_allocations, reorder_points, rng=rng)
+        cvariant = rng.choice(list(allocations))
+        new_reorder_points[cvariant] = rng.randrange(allocations[cvariant])
+        try:
+            validate_policy(component_assignments, allocations, new_reorder_points, 100)
+        except AssertionError:
+            continue
+        expected = run_simulation(
+            dataset,
+            component_assignments,
+            allocations,
+            new_reorder_points,
+            num_handlers=num_handlers,
+            day_end=5,
+            engine='fast',
+            progress=False,
+        )
+        assert list(evaluator.evaluate(allocations, new_reorder_points)) == list(expected)
+
+
+def test_evaluation_cache_round_trips_through_sqlite(tmp_path, dataset, component_assignments, inventory_allocations, reorder_points):
+    simulation_kwargs = {
+        'production_data': dataset,
+        'component_assignments': component_assignments,
+        'inventory_allocations': inventory_allocations,
+        'reorder_points': reorder_points,
+        'day_end': 3,
+        'engine': 'fast',
+        'progress': False,
+    }
+    simulation_metrics = run_simulation(cache=EvaluationCache(path=str(tmp_path / 'cache.sqlite')), **simulation_kwargs)
+
+    cache = EvaluationCache(path=str(tmp_path / 'cache.sqlite'))
+    cached_metrics = run_simulation(cache=cache, **simulation_kwargs)
+    assert cache.hits == 1
+    assert list(cached_metrics) == list(simulation_metrics)
+    (_, all_counts), = cache.items()
+    assert all_counts.shape == (3, len(SimulationMetrics.count_columns))
+
+    # Files written before the repair counts were stored hold one dict per day
+    key = cache.items()[0][0]
+    cache.connection.execute('UPDATE evaluations SET metrics = ? WHERE key = ?', (json.dumps(list(simulation_metrics)), key))
+    cache.connection.commit()
+    assert list(EvaluationCache(path=str(tmp_path / 'cache.sqlite')).get(key)) == list(simulation_metrics)
@@ -0,0 +1,123 @@
+import json
+import random
+
+import pytest
+
+from algo import NeighborGenerator, optimize_inventory, scale_policy, sweep_capacity, validate_policy
+
+
+def test_scale_policy_keeps_valid_policies(component_assignments, inventory_allocations, reorder_points):
+    for space_available in [140, 50, 9]:
+        allocations, scaled_reorder_points = scale_policy(inventory_allocations, reorder_points, space_available)
+        validate_policy(component_assignments, allocations, scaled_reorder_points, space_available)
+        assert min(allocations.values()) >= 1
+
+    with pytest.raises(AssertionError):
+        scale_policy(inventory_allocations, reorder_points, 5)
+
+
+def test_neighbor_generator_proposes_valid_policies_without_repeats(component_assignments, inventory_allocations, reorder_points):
+    # Start at the edge of the feasible region: a donor with a single unit and a reorder point of 0
+    inventory_allocations = dict(inventory_allocations, CE1=1, CE9=24)
+    reorder_points = dict(reorder_points, CE1=0, CE9=23, CD4=0)
+    validate_policy(component_assignments, inventory_allocations, reorder_points, 100)
+
+    neighbor_generator = NeighborGenerator(inventory_allocations)
+    neighbor_generator.remember(inventory_allocations, reorder_points)
+    rng = random.Random(0)
+    seen = {neighbor_generator.policy_hash(inventory_allocations, reorder_points)}
+    for _ in range(2000):
+        move, inventory_allocations, reorder_points = neighbor_generator.propose(inventory_allocations, reorder_points, rng=rng)
+        validate_policy(component_assignments, inventory_allocations, reorder_points, 100)
+        policy_hash = neighbor_generator.policy_hash(inventory_allocations, reorder_points)
+        assert policy_hash not in seen
+        seen.add(policy_hash)
+        neighbor_generator.record(move, inventory_allocations, reorder_points, accepted=True)
+
+
+def test_sweep_capacity_skips_capacities_below_the_variant_count(capsys, dataset, component_assignments, inventory_allocations, reorder_points):
+    *_, frontier = sweep_capacity(
+        inventory_allocations,
+        reorder_points,
+        dataset,
+        component_assignments,
+        target_cost=float('inf'),
+        capacities=[20, 5],
+        evaluations_per_level=1,
+        workers=1,
+        verbose=False,
+    )
+    assert frontier['space_available'].tolist() == [20, 5]
+    assert frontier['skipped'].tolist() == [False, True]
+    captured = capsys.readouterr()
+    assert captured.out == ''
+    assert captured.err == ''
+
+
+def test_optimize_inventory_is_silent_when_not_verbose(capsys, dataset, component_assignments, inventory_allocations, reorder_points):
+    optimize_inventory(
+        inventory_allocations,
+        reorder_points,
+        dataset,
+        component_assignments,
+        100,
+        max_iterations=3,
+        incremental=False,
+        day_end=2,
+        verbose=False,
+    )
+    captured = capsys.readouterr()
+    assert captured.out == ''
+    assert captured.err == ''
+
+
+def test_optimize_inventory_reports_the_surrogate_rank_correlation(tmp_path, dataset, component_assignments, inventory_allocations, reorder_points):
+    stats = {}
+    optimize_inventory(
+        inventory_allocations,
+        reorder_points,
+        dataset,
+        component_assignments,
+        100,
+        max_iterations=6,
+        screen_fraction=0.25,
+        day_end=3,
+        checkpoint_path=str(tmp_path / 'checkpoint.json'),
+        stats=stats,
+        verbose=False,
+    )
+    assert stats['iterations'] == 6
+    assert stats['evaluations'] > 1
+    assert -1 <= stats['surrogate_rank_correlation'] <= 1
+    with open(tmp_path / 'checkpoint.json') as checkpoint_file:
+        checkpoint = json.load(checkpoint_file)
+    assert checkpoint['surrogate']['rank_correlation'] == stats['surrogate_rank_correlation']
+
+
+@pytest.mark.parametrize('optimizer_kwargs', [{}, {'incremental': False}, {'screen_fraction': 0.25}, {'replications': 3}])
+def test_checkpoint_resume_matches_uninterrupted_run(tmp_path, optimizer_kwargs, dataset, component_assignments, inventory_allocations, reorder_points):
+    def optimize(checkpoint_path, max_iterations):
+        return optimize_inventory(
+            inventory_allocations,
+            reorder_points,
+            dataset,
+            component_assignments,
+            100,
+            max_iterations=max_iterations,
+            day_end=5,
+            checkpoint_path=str(checkpoint_path),
+            checkpoint_interval=4,
+            verbose=False,
+            **optimizer_kwargs,
+        )
+
+    uninterrupted = optimize(tmp_path / 'uninterrupted.json', 20)
+    optimize(tmp_path / 'resumed.json', 9)
+    resumed = optimize(tmp_path / 'resumed.json', 20)
+    assert resumed[:3] == uninterrupted[:3]
+    assert list(resumed[3]) == list(uninterrupted[3])
+    resumed_checkpoint = json.loads((tmp_path / 'resumed.json').read_text())
+    uninterrupted_checkpoint = json.loads((tmp_path / 'uninterrupted.json').read_text())
+    # Resuming touches the incumbent's cache entry, so only the order of the cache differs
+    assert dict(resumed_checkpoint.pop('cache')) == dict(uninterrupted_checkpoint.pop('cache'))
+    assert resumed_checkpoint == uninterrupted_checkpoint
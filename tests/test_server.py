@@ -0,0 +1,75 @@
+import json
+
+from algo import EvaluationServer, compute_total_cost, run_simulation
+
+
+def test_server_reports_invalid_requests_and_keeps_serving(dataset, component_assignments, inventory_allocations, reorder_points):
+    policy = {
+        'component_assignments': component_assignments,
+        'inventory_allocations': inventory_allocations,
+        'reorder_points': reorder_points,
+    }
+    requests = [
+        {'id': 'seed', 'seed': -1, **policy},
+        {'id': 'day_end', 'day_end': 2.5, **policy},
+        {'id': 'num_handlers', 'num_handlers': '2', **policy},
+        {'id': 'days', 'day_end': 400, **policy},
+        {'id': 'valid', 'day_end': 3, **policy},
+        {'id': 'duplicate', 'day_end': 3, **policy},
+    ]
+    results = []
+    server = EvaluationServer(dataset, workers=1)
+    try:
+        server.serve([[json.dumps(request) for request in requests], ['not json']], results.append)
+    finally:
+        server.close()
+
+    results = {result['id']: result for result in results}
+    assert len(results) == len(requests) + 1
+    for request_id in ['seed', 'day_end', 'num_handlers', 'days', None]:
+        assert 'error' in results[request_id]
+    total_cost = compute_total_cost(run_simulation(dataset, day_end=3, engine='simpy', progress=False, **policy))
+    assert results['valid']['Total_costs'] == total_cost
+    assert results['duplicate']['Total_costs'] == total_cost
+    assert server.evaluations == 1
+
+
+def test_server_rejects_fractional_policies_instead_of_truncating_them(dataset, component_assignments, inventory_allocations, reorder_points):
+    fractional_allocations = {**inventory_allocations, 'CE1': 1.5, 'CE2': 7.5}
+    allocations = {**inventory_allocations, 'CE1': 1, 'CE2': 7}
+    policy_reorder_points = {**reorder_points, 'CE1': 0}
+    requests = [
+        {
+            'id': 'fractional',
+            'day_end': 3,
+            'component_assignments': component_assignments,
+            'inventory_allocations': fractional_allocations,
+            'reorder_points': policy_reorder_points,
+        },
+        {
+            'id': 'integer',
+            'day_end': 3,
+            'component_assignments': component_assignments,
+            'inventory_allocations': allocations,
+            'reorder_points': policy_reorder_points,
+        },
+    ]
+    results = []
+    server = EvaluationServer(dataset, workers=1)
+    try:
+        server.serve([[json.dumps(request) for request in requests]], results.append)
+    finally:
+        server.close()
+
+    results = {result['id']: result for result in results}
+    assert 'error' in results['fractional']
+    total_cost = compute_total_cost(run_simulation(
+        dataset,
+        component_assignments,
+        allocations,
+        policy_reorder_points,
+        day_end=3,
+        engine='simpy',
+        progress=False,
+    ))
+    assert results['integer']['Total_costs'] == total_cost